@@ -1,3 +1,7 @@
+import copy
+import hashlib
+import io
+import json
 import os
 from os.path import (
     join,
@@ -17,6 +21,9 @@ env.Replace(COMPILATIONDB_PATH=join("$BUILD_DIR", "compile_commands.json"))
 
 # Name of the framework package being patched
 FRAMEWORK_PKG_NAME = "framework-arduinoadafruitnrf52"  # 确保这是您使用的正确框架包名
+# patch-ng version the in-process patching (_patch_bytes) was tested with
+PATCH_NG_REQUIREMENT = "patch-ng==1.19.1"
+
 FRAMEWORK_DIR = env.PioPlatform().get_package_dir(FRAMEWORK_PKG_NAME)
 if not FRAMEWORK_DIR or not isfile(
     join(FRAMEWORK_DIR, "programmers.txt")
@@ -42,178 +49,452 @@ if not exists(patchflag_dir):
 patchflag_filename = f".{FRAMEWORK_PKG_NAME}.patching-done"
 patchflag_path = join(patchflag_dir, patchflag_filename)
 
+patches_dir = join(env.get("PROJECT_DIR"), "patches")
+patches_manifest_path = join(patches_dir, "manifest.json")
+
+# patches/manifest.json 列出要打的补丁：{"target": 框架内文件的相对路径（用 / 分隔）, "patch": patches 目录中的补丁文件名}
+# 修改 target 或补丁内容都会改变该补丁的哈希，从而只重新打这一个补丁
+try:
+    with open(patches_manifest_path, encoding="utf-8") as fp:
+        patches_manifest = json.load(fp)
+except FileNotFoundError:
+    patches_manifest = []
+except ValueError as e:
+    print(f"Error: Invalid patch manifest {patches_manifest_path}: {e}")
+    Exit(1)
+
 # 列表中的每个项目都是一个元组：(框架内文件的相对路径, 项目patches目录中的补丁文件名)
 patches_to_apply = [
-    (
-        join(
-            "cores", "nRF5", "RingBuffer.h"
-        ),  # Relative path to the RingBuffer header file
-        "RingBuffer.h.patch",  # Your .patch file
-    ),
+    (join(*entry["target"].split("/")), entry["patch"]) for entry in patches_manifest
 ]
 
-# MODIFIED: Logic for applying patches with backup and rollback
-if not isfile(patchflag_path):
-    print(
-        f"Framework {FRAMEWORK_PKG_NAME} patching needed. Flag not found: {patchflag_path}"
+# 每个补丁的路径只解析一次：
+# (相对路径, 补丁文件名, 框架内目标文件, 补丁文件, 目标文件的 .bak)
+resolved_patches = [
+    (
+        relative_path_to_target,
+        patch_file_name,
+        join(FRAMEWORK_DIR, relative_path_to_target),
+        join(patches_dir, patch_file_name),
+        join(FRAMEWORK_DIR, relative_path_to_target) + ".bak",
     )
+    for relative_path_to_target, patch_file_name in patches_to_apply
+]
+
+# 一次 scandir 列出项目 patches 目录中的补丁文件，代替逐个 isfile 检查
+try:
+    with os.scandir(patches_dir) as entries:
+        patches_available = {entry.name for entry in entries if entry.is_file()}
+except FileNotFoundError:
+    patches_available = set()
+
+
+def _patch_hash(relative_path_to_target, patch_file_name, patch_file_path):
+    """md5 over the target path and patch contents; None if the patch is missing."""
+    if patch_file_name not in patches_available:
+        return None
+    md5 = hashlib.md5(relative_path_to_target.encode("utf-8"))
+    with open(patch_file_path, "rb") as fp:
+        md5.update(fp.read())
+    return md5.hexdigest()
 
-    if not patches_to_apply:
+
+def _patches_state():
+    """Current {patch_file_name: hash} for every configured patch."""
+    return {
+        patch_file_name: _patch_hash(
+            relative_path_to_target, patch_file_name, patch_file_path
+        )
+        for relative_path_to_target, patch_file_name, _, patch_file_path, _ in (
+            resolved_patches
+        )
+    }
+
+
+def _load_patch_flag(current_state):
+    """Patches applied by earlier runs, or None if the flag is malformed.
+
+    Returns {patch_file_name: {"patch": hash, "pristine": hash}}, where
+    "pristine" is the md5 of the target's .bak, or None when no pristine copy
+    is known to exist.
+    """
+    try:
+        with open(patchflag_path) as fp:
+            flag = json.load(fp)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        # Flag from before hashes were recorded: it only says patching
+        # succeeded, so trust it for the patches configured today. That
+        # script deleted its backups, so no pristine copy is known.
+        print(f"Migrating legacy patch flag: {patchflag_path}")
+        migrated_state = {
+            patch_file_name: {"patch": patch_hash, "pristine": None}
+            for patch_file_name, patch_hash in current_state.items()
+        }
+        # Saved now, so a later patch edit is not mistaken as applied too
+        _write_patch_flag(migrated_state)
+        return migrated_state
+    if not isinstance(flag, dict):
+        return None
+    applied_state = {}
+    for patch_file_name, entry in flag.items():
+        if isinstance(entry, str):
+            # Flag that recorded patch hashes only, without the backup's
+            entry = {"patch": entry}
+        elif not isinstance(entry, dict):
+            return None
+        applied_state[patch_file_name] = {
+            "patch": entry.get("patch"),
+            "pristine": entry.get("pristine"),
+        }
+    return applied_state
+
+
+def _write_patch_flag(state):
+    """Record state as the patches applied; exits the build on failure."""
+    print(f"Creating patch flag: {patchflag_path}")
+    try:
+        # Write then rename: a torn flag would otherwise be read back
+        # as a legacy flag and trusted
+        patchflag_tmp_path = patchflag_path + ".tmp"
+        with open(patchflag_tmp_path, "w") as fp:
+            fp.write(json.dumps(state, indent=2, sort_keys=True))
+        os.replace(patchflag_tmp_path, patchflag_path)
         print(
-            "No patches defined in patches_to_apply list. Nothing to do. Patch flag not created."
+            "Patch flag created successfully."
+        )  # MODIFIED: Removed unnecessary f-string
+    except IOError as e:
+        print(f"Error creating patch flag file {patchflag_path}: {e}")
+        # Patches were applied, but flag creation failed.
+        # This is an inconsistent state. Build should ideally fail.
+        Exit(1)
+
+
+def _locate_hunks(lines, hunks):
+    """Copies of hunks moved to where their context is found, or None.
+
+    Like GNU patch, each hunk is looked for at its stated line shifted by the
+    offset the previous hunk was found at, then at growing distances either
+    side of it. Context and removed lines must match exactly (no fuzz).
+    """
+    stripped = [line.rstrip(b"\r\n") for line in lines]
+    located = []
+    offset = 0
+    min_start = 0  # hunks apply in order and must not overlap
+    for hunk in hunks:
+        expected = [
+            line[1:].rstrip(b"\r\n") for line in hunk.text if line[:1] in (b" ", b"-")
+        ]
+        wanted = hunk.startsrc - 1 + offset
+        last = len(stripped) - len(expected)
+        for distance in range(max(wanted - min_start, last - wanted) + 1):
+            start = next(
+                (
+                    start
+                    for start in (wanted - distance, wanted + distance)
+                    if min_start <= start <= last
+                    and stripped[start : start + len(expected)] == expected
+                ),
+                None,
+            )
+            if start is not None:
+                break
+        else:
+            return None
+        moved = copy.copy(hunk)
+        moved.startsrc = start + 1
+        located.append(moved)
+        offset = start - (hunk.startsrc - 1)
+        min_start = start + len(expected)
+    return located
+
+
+def _patch_bytes(pristine, patch_file_path):
+    """Patched contents of pristine, or (None, error message)."""
+    pset = patch_ng.fromfile(patch_file_path)
+    if not pset:
+        return None, f"Error: Could not parse patch file: {patch_file_path}"
+    # 与 `patch <file> <patch>` 一样只作用于指定的目标文件，忽略补丁头中的路径
+    lines = pristine.splitlines(keepends=True)
+    for item in pset.items:
+        hunks = _locate_hunks(lines, item.hunks)
+        if hunks is None:
+            return None, (
+                f"Hunks in {patch_file_path} did not apply.\n"
+                "Hunks may be found at a line offset, but their context must match "
+                "exactly (no fuzz).\n"
+                "Make sure the patch matches the framework version installed."
+            )
+        lines = list(pset.patch_stream(io.BytesIO(b"".join(lines)), hunks))
+    return b"".join(lines), None
+
+
+def _backup_and_patch(
+    original_file_path, backup_file_path, patch_file_path, pristine_hash
+):
+    """Back up and patch one target from a single read of its pristine bytes.
+
+    pristine_hash is False if the flag has no record of patching the target,
+    which is then itself pristine; otherwise it is the md5 recorded for the
+    .bak (None if unknown), which must match before the .bak is used.
+
+    Returns (backup_created, backup_ready, pristine_hash, error): whether this
+    call wrote the .bak, whether a pristine .bak now exists, the md5 of the
+    pristine bytes, and an error message or None.
+    """
+    reinstall_hint = (
+        f"Reinstall the {FRAMEWORK_PKG_NAME} package to restore the unpatched "
+        f"framework, then delete {patchflag_path} and build again."
+    )
+    backup_created = False
+    if pristine_hash is False:
+        if isfile(backup_file_path):
+            print(
+                f"Warning: Pre-existing backup file found: {backup_file_path}. Replacing it with the unpatched target."
+            )
+        try:
+            with open(original_file_path, "rb") as fp:
+                pristine = fp.read()
+            with open(backup_file_path, "wb") as fp:
+                backup_created = True
+                fp.write(pristine)
+            shutil.copystat(original_file_path, backup_file_path)
+        except Exception as e:
+            if backup_created:
+                # A partial .bak would later be mistaken for the pristine file
+                try:
+                    os.remove(backup_file_path)
+                except OSError:
+                    pass
+            return False, False, None, f"Error backing up {original_file_path}: {e}"
+    elif pristine_hash is None:
+        # Patched by a script that kept no verified backup: the target holds
+        # an older patch and no pristine copy can be trusted.
+        return False, False, None, (
+            f"Error: {original_file_path} is already patched and no verified "
+            f"pristine backup of it exists. {reinstall_hint}"
         )
     else:
-        backup_files_map = {}  # Stores original_path: backup_path
-        backup_creation_successful = True
-
-        # --- Backup Phase ---
-        print("Starting backup phase...")
-        for relative_path_to_target, patch_file_name in patches_to_apply:
-            original_file_path = join(FRAMEWORK_DIR, relative_path_to_target)
-            # Check existence of patch file itself early on
-            patch_file_path_check = join(
-                env.get("PROJECT_DIR"), "patches", patch_file_name
+        # The pristine file kept by an earlier run; patch from it so the new
+        # patch applies to unmodified code.
+        try:
+            with open(backup_file_path, "rb") as fp:
+                pristine = fp.read()
+        except FileNotFoundError:
+            return False, False, None, (
+                f"Error: Pristine backup {backup_file_path} is missing and "
+                f"{original_file_path} is already patched. {reinstall_hint}"
+            )
+        except Exception as e:
+            return False, False, None, f"Error reading backup {backup_file_path}: {e}"
+        if hashlib.md5(pristine).hexdigest() != pristine_hash:
+            return False, False, None, (
+                f"Error: Backup {backup_file_path} does not match the pristine "
+                f"file recorded in {patchflag_path}. {reinstall_hint}"
             )
 
-            if not isfile(original_file_path):
-                print(
-                    f"Error: Original file for patching not found (cannot backup): {original_file_path}"
-                )
-                backup_creation_successful = False
-                break
+    pristine_hash = hashlib.md5(pristine).hexdigest()
+    try:
+        patched, error = _patch_bytes(pristine, patch_file_path)
+        if error is not None:
+            return (
+                backup_created,
+                True,
+                pristine_hash,
+                f"Error patching {original_file_path}. {error}",
+            )
+        with open(original_file_path, "wb") as fp:
+            fp.write(patched)
+    except Exception as e:
+        return (
+            backup_created,
+            True,
+            pristine_hash,
+            f"Exception during patching of {original_file_path}: {e}",
+        )
+    return backup_created, True, pristine_hash, None
 
-            if not isfile(patch_file_path_check):
-                print(f"Error: Patch file not found: {patch_file_path_check}")
-                backup_creation_successful = False
-                break
 
-            backup_file_path = original_file_path + ".bak"
-            try:
-                # If a backup file from a previous failed run exists, remove it first.
-                if isfile(backup_file_path):
-                    print(
-                        f"Warning: Pre-existing backup file found: {backup_file_path}. Removing it before creating a new one."
-                    )
-                    os.remove(backup_file_path)
-                shutil.copy2(original_file_path, backup_file_path)
-                backup_files_map[original_file_path] = backup_file_path
-                print(f"Backed up: {original_file_path} to {backup_file_path}")
-            except Exception as e:
-                print(f"Error backing up {original_file_path}: {e}")
-                backup_creation_successful = False
-                break
+current_patch_state = _patches_state()
+applied_patch_state = _load_patch_flag(current_patch_state)
+if applied_patch_state is None:
+    print(f"Error: Invalid patch flag {patchflag_path}: expected a JSON object.")
+    print(
+        f"Reinstall the {FRAMEWORK_PKG_NAME} package if it may already be patched, "
+        "then delete the flag and build again."
+    )
+    Exit(1)
+# Only patches whose contents (or target) changed since the last run; a
+# missing patch file stays pending so the pre-flight check reports it.
+pending_patches = [
+    resolved
+    for resolved in resolved_patches
+    if current_patch_state[resolved[1]] is None
+    or applied_patch_state.get(resolved[1], {}).get("patch")
+    != current_patch_state[resolved[1]]
+]
+
+# MODIFIED: Logic for applying patches with backup and rollback
+# 每个目标文件的 .bak 保存未打补丁的原始版本，补丁内容变化时从它恢复后重新打补丁
+if not patches_to_apply:
+    print(
+        f"No patches defined in {patches_manifest_path}. Nothing to do. Patch flag not created."
+    )
+elif pending_patches:
+    print(
+        f"Framework {FRAMEWORK_PKG_NAME} patching needed for: "
+        + ", ".join(resolved[1] for resolved in pending_patches)
+    )
+
+    # Patches are applied in-process; install patch-ng into PlatformIO's
+    # Python the first time it is needed.
+    try:
+        import patch_ng
+    except ImportError:
+        if env.Execute(f"$PYTHONEXE -m pip install {PATCH_NG_REQUIREMENT}"):
+            print(
+                f"Error: Could not install {PATCH_NG_REQUIREMENT} into PlatformIO's Python."
+            )
+            print(
+                "Install it manually with: "
+                + env.subst(f"$PYTHONEXE -m pip install {PATCH_NG_REQUIREMENT}")
+            )
+            Exit(1)
+        import patch_ng
+
+    backup_files_map = {}  # Stores original_path: backup_path
+    patched_state = {}  # patch_file_name: flag entry for patches applied now
+    all_patches_applied_successfully = True  # Assume success for this phase
 
-        if not backup_creation_successful:
-            print("Backup phase failed. Cleaning up any created backups...")
-            # Iterate over items in backup_files_map as those are the ones attempted/created
-            for _orig_path, bk_path in backup_files_map.items():
-                if isfile(
-                    bk_path
-                ):  # Check if backup was actually created before trying to remove
-                    try:
-                        os.remove(bk_path)
-                        print(f"Removed incomplete backup: {bk_path}")
-                    except Exception as e_rem:
-                        print(f"Error removing incomplete backup {bk_path}: {e_rem}")
-            print("Patching aborted due to backup failure.")
+    # --- Pre-flight: every target and patch file must exist ---
+    # (patch_file_name, original_file_path, backup_file_path, patch_file_path)
+    patch_jobs = []
+    for (
+        _,
+        patch_file_name,
+        original_file_path,
+        patch_file_path,
+        backup_file_path,
+    ) in pending_patches:
+        if not isfile(original_file_path):
+            print(
+                f"Error: Original file for patching not found (cannot backup): {original_file_path}"
+            )
+            print("Patching aborted before any file was modified.")
             Exit(1)
 
-        # --- Patching Phase (only if all backups were successful) ---
-        all_patches_applied_successfully = True  # Assume success for this phase
-        print("Starting patching phase...")
-        for relative_path_to_target, patch_file_name in patches_to_apply:
-            original_file_path = join(FRAMEWORK_DIR, relative_path_to_target)
-            patch_file_path = join(env.get("PROJECT_DIR"), "patches", patch_file_name)
+        if patch_file_name not in patches_available:
+            print(f"Error: Patch file not found: {patch_file_path}")
+            print("Patching aborted before any file was modified.")
+            Exit(1)
 
-            # Original file and patch file existence already checked in backup phase.
-            print(f"Attempting to patch: {original_file_path}")
-            print(f"Using patch file: {patch_file_path}")
-            cmd = f'patch "{original_file_path}" "{patch_file_path}"'
+        patch_jobs.append(
+            (patch_file_name, original_file_path, backup_file_path, patch_file_path)
+        )
+
+    # --- Backup + Patch Phase: one read of each pristine file feeds both ---
+    print("Starting backup and patching phase...")
+    for patch_file_name, original_file_path, backup_file_path, patch_file_path in (
+        patch_jobs
+    ):
+        print(f"Attempting to patch: {original_file_path}")
+        print(f"Using patch file: {patch_file_path}")
+        applied = applied_patch_state.get(patch_file_name)
+        backup_created, backup_ready, pristine_hash, error = _backup_and_patch(
+            original_file_path,
+            backup_file_path,
+            patch_file_path,
+            applied["pristine"] if applied else False,
+        )
+        if backup_created:
+            print(f"Backed up: {original_file_path} to {backup_file_path}")
+        elif backup_ready:
+            print(f"Patching from pristine backup: {backup_file_path}")
+        if backup_ready:
+            backup_files_map[original_file_path] = backup_file_path
+        if error is not None:
+            print(error)
+            all_patches_applied_successfully = False
+            break  # Stop on first error
+        print(f"Successfully patched: {original_file_path}")
+        patched_state[patch_file_name] = {
+            "patch": current_patch_state[patch_file_name],
+            "pristine": pristine_hash,
+        }
 
+    # --- Post-Patching / Rollback / Finalize Phase ---
+    if all_patches_applied_successfully:
+        print("All defined patches applied successfully.")
+        # Backups are kept: they are the pristine sources for re-patching
+        # when a patch file changes.
+        for _orig_path, bk_path in backup_files_map.items():
+            print(f"Keeping pristine backup: {bk_path}")
+
+        # Create patch flag, keeping the records of patches not reapplied
+        _write_patch_flag(
+            {
+                patch_file_name: patched_state.get(
+                    patch_file_name, applied_patch_state.get(patch_file_name)
+                )
+                for patch_file_name in current_patch_state
+                if patch_file_name in patched_state
+                or patch_file_name in applied_patch_state
+            }
+        )
+    else:
+        # Rollback from backups
+        print("One or more patches failed. Initiating rollback...")
+        for original_path, backup_path_to_restore in backup_files_map.items():
             try:
-                return_code = env.Execute(cmd)
-                if return_code == 0:
-                    print(f"Successfully patched: {original_file_path}")
-                else:
-                    print(
-                        f"Error patching {original_file_path}. 'patch' command returned {return_code}."
-                    )
-                    print(
-                        "Make sure the patch file format is compatible and the 'patch' command is installed and in PATH."
-                    )
-                    all_patches_applied_successfully = False
-                    break  # Stop on first error
-            except Exception as e:
-                print(f"Exception during patching of {original_file_path}: {e}")
+                shutil.move(
+                    backup_path_to_restore, original_path
+                )  # Moves backup over original
+                print(f"Restored: {original_path} from {backup_path_to_restore}")
+            except FileNotFoundError:
+                # This case implies the backup file was not found for restoration.
+                # If backup_files_map is correctly populated, this shouldn't happen unless
+                # the backup file was deleted by an external process or an earlier error in cleanup logic.
                 print(
-                    "Ensure the 'patch' command is installed and in your system PATH."
+                    f"Warning: Backup file {backup_path_to_restore} not found during rollback for {original_path}. The original file might be in a modified state if patching started on it."
                 )
-                all_patches_applied_successfully = False
-                break  # Stop on first error
-
-        # --- Post-Patching / Rollback / Finalize Phase ---
-        if all_patches_applied_successfully:
-            print("All defined patches applied successfully.")
-            # Clean up backups by removing them
-            print("Cleaning up backup files...")
-            for _orig_path, bk_path in backup_files_map.items():
-                if isfile(bk_path):
-                    try:
-                        os.remove(bk_path)
-                        print(f"Removed backup: {bk_path}")
-                    except Exception as e:
-                        # Log error but consider this non-critical for build success at this point
-                        print(f"Error removing backup file {bk_path}: {e}")
-
-            # Create patch flag
-            print(f"Creating patch flag: {patchflag_path}")
-            try:
-                with open(patchflag_path, "w") as fp:
-                    for rel_path, patch_name in patches_to_apply:
-                        fp.write(f"- {rel_path} with {patch_name}\n")
+            except Exception as e:
                 print(
-                    "Patch flag created successfully."
-                )  # MODIFIED: Removed unnecessary f-string
-            except IOError as e:
-                print(f"Error creating patch flag file {patchflag_path}: {e}")
-                # Patches were applied, but flag creation failed.
-                # This is an inconsistent state. Build should ideally fail.
-                Exit(1)
-        else:
-            # Rollback from backups
-            print("One or more patches failed. Initiating rollback...")
-            for original_path, backup_path_to_restore in backup_files_map.items():
-                # Only attempt to restore if the backup file actually exists
-                if isfile(backup_path_to_restore):
-                    try:
-                        shutil.move(
-                            backup_path_to_restore, original_path
-                        )  # Moves backup over original
-                        print(
-                            f"Restored: {original_path} from {backup_path_to_restore}"
-                        )
-                    except Exception as e:
-                        print(
-                            f"CRITICAL: Error restoring {original_path} from {backup_path_to_restore}: {e}"
-                        )
-                        # At this point, state of original_file_path is uncertain.
-                else:
-                    # This case implies the backup file was not found for restoration.
-                    # If backup_files_map is correctly populated, this shouldn't happen unless
-                    # the backup file was deleted by an external process or an earlier error in cleanup logic.
-                    print(
-                        f"Warning: Backup file {backup_path_to_restore} not found during rollback for {original_path}. The original file might be in a modified state if patching started on it."
-                    )
+                    f"CRITICAL: Error restoring {original_path} from {backup_path_to_restore}: {e}"
+                )
+                # At this point, state of original_file_path is uncertain.
 
-            print(
-                "Rollback attempted. Patch flag will NOT be created. Please check errors above."
+        # Restored targets are unpatched again; stop recording their patches
+        # so the next run backs up the restored file as pristine
+        restored_targets = {
+            original_path
+            for original_path, backup_path in backup_files_map.items()
+            if not exists(backup_path)
+        }
+        rolled_back = {
+            patch_file_name
+            for patch_file_name, original_path, _, _ in patch_jobs
+            if original_path in restored_targets
+        }
+        if rolled_back & applied_patch_state.keys():
+            _write_patch_flag(
+                {
+                    patch_file_name: entry
+                    for patch_file_name, entry in applied_patch_state.items()
+                    if patch_file_name not in rolled_back
+                }
             )
-            Exit(1)  # Signal failure
+
+        print(
+            "Rollback attempted. Failed patches are NOT recorded in the patch flag. Please check errors above."
+        )
+        Exit(1)  # Signal failure
 else:
     print(
-        f"Framework {FRAMEWORK_PKG_NAME} already patched for this environment (flag found: {patchflag_path}). Skipping."
+        f"Framework {FRAMEWORK_PKG_NAME} already patched for this environment (patch hashes match {patchflag_path}). Skipping."
     )
 
+# 修改 patches/ 下的补丁文件后会自动重新打补丁，无需手动删除标志文件
 # 提示：要强制重新打补丁，请从项目的 .pio/build/<envname>/ 目录中删除相应的 .patching-done 文件
 # 例如，在命令行中运行: del .pio\\build\\promicro_nrf52840\\.framework-arduinoadafruitnrf52.patching-done (Windows)
 # 或者运行 'pio run -t clean' (如果 clean 会删除构建目录，通常是这样)
@@ -6,38 +6,155 @@ Compatible with nRF52840 and other microcontrollers that support UF2 bootloader
 """
 
 import os
-import sys
-import subprocess
+import functools
+import hashlib
+import importlib.util
+import mmap
+import shutil
 from os.path import join, isfile, exists, dirname, basename, splitext
+import urllib.error
 import urllib.request
+import email.utils
 import stat
+import time
 
 Import("env")
 
+# Resolved once when the script loads rather than on every post-action
+PROJECT_DIR = env.get("PROJECT_DIR")
+PROJECT_CORE_DIR = env.subst("$PROJECT_CORE_DIR")
 
-def download_uf2conv():
-    """Download uf2conv.py if it doesn't exist"""
-    uf2conv_path = join(env.get("PROJECT_DIR"), "uf2conv.py")
 
-    if not isfile(uf2conv_path):
-        print("Downloading uf2conv.py...")
-        try:
-            url = "https://raw.githubusercontent.com/microsoft/uf2/master/utils/uf2conv.py"
-            urllib.request.urlretrieve(url, uf2conv_path)
+UF2_UTILS_URL = "https://raw.githubusercontent.com/microsoft/uf2/master/utils/"
+# uf2conv.py loads uf2families.json from its own directory
+UF2_UTILS_FILES = ("uf2conv.py", "uf2families.json")
+# Revalidate the shared cache against upstream at most once a day
+UF2_CACHE_MAX_AGE = 24 * 60 * 60
 
-            # Make it executable on Unix-like systems
-            if os.name != "nt":
-                st = os.stat(uf2conv_path)
-                os.chmod(uf2conv_path, st.st_mode | stat.S_IEXEC)
 
-            print(f"Downloaded uf2conv.py to {uf2conv_path}")
-        except Exception as e:
-            print(f"Error downloading uf2conv.py: {e}")
-            return None
+def fetch_if_modified(url, path):
+    """Download url to path unless the cached copy is still current"""
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        mtime = None
+
+    if mtime is None:
+        request = urllib.request.Request(url)
+    elif time.time() - mtime < UF2_CACHE_MAX_AGE:
+        return
+    else:
+        request = urllib.request.Request(
+            url,
+            headers={"If-Modified-Since": email.utils.formatdate(mtime, usegmt=True)},
+        )
+
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            data = response.read()
+    except urllib.error.HTTPError as e:
+        if mtime is None:
+            raise
+        if e.code == 304:
+            os.utime(path)  # Not modified upstream; restart the max-age window
+        else:
+            print(
+                f"Warning: Could not revalidate {path} (HTTP {e.code}), using cached copy"
+            )
+        return
+    except urllib.error.URLError:
+        if mtime is None:
+            raise
+        print(f"Warning: Could not revalidate {path}, using cached copy")
+        return
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(data)
+    os.replace(tmp_path, path)
+    print(f"Downloaded {basename(path)} to {path}")
+
+
+@functools.lru_cache(maxsize=None)
+def download_uf2conv():
+    """Locate uf2conv.py, downloading it to the shared cache if needed"""
+    # Prefer the copy checked in next to platformio.ini
+    uf2conv_path = join(PROJECT_DIR, "uf2conv.py")
+    if isfile(uf2conv_path):
+        return uf2conv_path
+
+    # Otherwise share one cached copy between all projects
+    cache_dir = join(PROJECT_CORE_DIR, ".cache", "uf2")
+    uf2conv_path = join(cache_dir, "uf2conv.py")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in UF2_UTILS_FILES:
+            fetch_if_modified(UF2_UTILS_URL + name, join(cache_dir, name))
+
+        # Make it executable on Unix-like systems
+        if os.name != "nt":
+            st = os.stat(uf2conv_path)
+            os.chmod(uf2conv_path, st.st_mode | stat.S_IEXEC)
+    except Exception as e:
+        print(f"Error downloading uf2conv.py: {e}")
+        return None
 
     return uf2conv_path
 
 
+def load_uf2conv(uf2conv_path):
+    """Import uf2conv.py as a module so conversion runs in this interpreter"""
+    spec = importlib.util.spec_from_file_location("uf2conv", uf2conv_path)
+    uf2conv = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(uf2conv)
+    return uf2conv
+
+
+def sha256_file(path):
+    """sha256 hex digest of a file, hashed without reading it into memory"""
+    with open(path, "rb") as fp:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            return hashlib.file_digest(fp, "sha256").hexdigest()
+        if os.fstat(fp.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()  # mmap rejects empty files
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.sha256(mm).hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Make dst a hardlink to src, copying when linking is not possible"""
+    try:
+        if os.path.samefile(src, dst):
+            # Linked by an earlier build; rewriting src already updated dst
+            return "already linked"
+    except FileNotFoundError:
+        pass
+
+    tmp_path = dst + ".tmp"
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        # Different volume, or a filesystem without hardlinks
+        shutil.copy2(src, dst)
+        return "copied"
+    os.replace(tmp_path, dst)
+    return "linked"
+
+
+def publish_to_project_root(uf2_file):
+    """Copy the UF2 file to the project root for easy access"""
+    project_uf2 = join(PROJECT_DIR, basename(uf2_file))
+    try:
+        how = link_or_copy(uf2_file, project_uf2)
+        print(f"✓ UF2 file {how} to project root: {project_uf2}")
+    except Exception as e:
+        print(f"Warning: Could not copy UF2 to project root: {e}")
+
+
 def generate_uf2_file(source, target, env):
     """Generate UF2 file from the built firmware"""
 
@@ -61,72 +178,73 @@ def generate_uf2_file(source, target, env):
         print("Error: No hex or bin file found for UF2 conversion")
         return
 
+    # Output UF2 file path
+    uf2_file = join(firmware_dir, firmware_name + ".uf2")
+    # sha256 of the firmware the current UF2 was generated from
+    hash_file = uf2_file + ".sha256"
+
+    try:
+        firmware_hash = sha256_file(input_file)
+    except OSError as e:
+        print(f"Error reading {input_file}: {e}")
+        return
+
+    # No-op rebuilds see the same firmware as the last conversion
+    try:
+        with open(hash_file) as fp:
+            up_to_date = fp.read().strip() == firmware_hash and isfile(uf2_file)
+    except FileNotFoundError:
+        up_to_date = False
+    if up_to_date:
+        print(f"UF2 up to date: {uf2_file}")
+        # The project root copy may have been deleted since, or failed to copy
+        publish_to_project_root(uf2_file)
+        return
+
     # Download uf2conv.py if needed
     uf2conv_path = download_uf2conv()
     if not uf2conv_path:
         print("Error: Could not obtain uf2conv.py")
         return
 
-    # Output UF2 file path
-    uf2_file = join(firmware_dir, firmware_name + ".uf2")
-
     # nRF52840 family ID for UF2
     # See: https://github.com/microsoft/uf2/blob/master/utils/uf2families.json
     family_id = "0xADA52840"  # nRF52840
 
     try:
-        # Build the command
-        cmd = [
-            sys.executable,
-            uf2conv_path,
-            input_file,
-            "--convert",
-            "--family",
-            family_id,
-            "--output",
-            uf2_file,
-        ]
-
-        # For bin files, we need to specify the base address
-        if input_format == "bin":
-            # nRF52840 application base address (after SoftDevice)
-            base_addr = "0x26000"  # Typical for S140 SoftDevice
-            cmd.extend(["--base", base_addr])
+        uf2conv = load_uf2conv(uf2conv_path)
+        uf2conv.familyid = int(family_id, 16)
+
+        with open(input_file, "rb") as fp:
+            firmware = fp.read()
 
         print(f"Generating UF2 file: {uf2_file}")
-        print(f"Command: {' '.join(cmd)}")
-
-        # Execute the conversion
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode == 0:
-            if isfile(uf2_file):
-                file_size = os.path.getsize(uf2_file)
-                print(
-                    f"✓ UF2 file generated successfully: {uf2_file} ({file_size} bytes)"
-                )
-
-                # Copy to project root for easy access
-                project_uf2 = join(env.get("PROJECT_DIR"), firmware_name + ".uf2")
-                try:
-                    import shutil
-
-                    shutil.copy2(uf2_file, project_uf2)
-                    print(f"✓ UF2 file copied to project root: {project_uf2}")
-                except Exception as e:
-                    print(f"Warning: Could not copy UF2 to project root: {e}")
-            else:
-                print("Error: UF2 file was not created")
+
+        if input_format == "hex":
+            # Hex records carry their own addresses
+            uf2_data = uf2conv.convert_from_hex_to_uf2(firmware.decode("utf-8"))
         else:
-            print(f"Error running uf2conv.py: {result.stderr}")
-            print(f"stdout: {result.stdout}")
+            # For bin files, we need to specify the base address
+            # nRF52840 application base address (after SoftDevice)
+            base_addr = "0x26000"  # Typical for S140 SoftDevice
+            uf2conv.appstartaddr = int(base_addr, 16)
+            uf2_data = uf2conv.convert_to_uf2(firmware)
+
+        with open(uf2_file, "wb") as fp:
+            fp.write(uf2_data)
+        with open(hash_file, "w") as fp:
+            fp.write(firmware_hash)
+
+        print(f"✓ UF2 file generated successfully: {uf2_file} ({len(uf2_data)} bytes)")
+
+        publish_to_project_root(uf2_file)
 
     except Exception as e:
         print(f"Error generating UF2 file: {e}")
 
 
-# Register the post-build action for multiple targets
-env.AddPostAction("$BUILD_DIR/${PROGNAME}.elf", generate_uf2_file)
+# Register the post-build action on the hex only: nRF52 builds always emit
+# it, and an .elf action would run first against the previous build's hex
 env.AddPostAction("$BUILD_DIR/${PROGNAME}.hex", generate_uf2_file)
 
 print("UF2 generation script loaded. UF2 file will be created after successful build.")
@@ -12,15 +12,22 @@ This script:
 4. Outputs Rust code for the bitmap array
 """
 
-from PIL import Image
+from PIL import Image, ImageChops
 import sys
 from pathlib import Path
 
+# Maps a pixel value to its ASCII bit: 0 -> '0', anything else -> '1'
+BIT_DIGITS = b'0' + b'1' * 255
 
-def image_to_mono_bitmap(img: Image.Image, bg_threshold: int = 250) -> list[list[int]]:
+# Rust literal for every byte value, formatted once
+HEX_LITERALS = [f"0x{b:02X}" for b in range(256)]
+
+
+def image_to_mono_bitmap(img: Image.Image, bg_threshold: int = 250, invert: bool = False) -> list[list[int]]:
     """Convert image to monochrome bitmap.
     
     Detects non-white pixels as "on" (Ferris is orange on white background).
+    With invert, the background pixels are "on" instead.
     """
     
     # Convert to RGB if not already
@@ -28,19 +35,17 @@ def image_to_mono_bitmap(img: Image.Image, bg_threshold: int = 250) -> list[list
         img = img.convert('RGB')
     
     width, height = img.size
-    bitmap = []
     
-    for y in range(height):
-        row = []
-        for x in range(width):
-            r, g, b = img.getpixel((x, y))
-            # White background detection: if all channels are near 255, it's background
-            is_background = (r > bg_threshold and g > bg_threshold and b > bg_threshold)
-            pixel_on = not is_background
-            row.append(1 if pixel_on else 0)
-        bitmap.append(row)
+    # White background detection: if all channels are near 255, it's background.
+    # The darkest channel of each pixel decides, so take the per-pixel minimum
+    # of R, G and B and threshold it through a lookup table in Pillow's C core.
+    # Inverting just swaps the table's outputs, so no pixel is touched twice.
+    background, foreground = (1, 0) if invert else (0, 1)
+    r, g, b = img.split()
+    darkest = ImageChops.darker(ImageChops.darker(r, g), b)
+    pixels = darkest.point(lambda v: background if v > bg_threshold else foreground).tobytes()
     
-    return bitmap
+    return [list(pixels[y * width:(y + 1) * width]) for y in range(height)]
 
 
 def bitmap_to_bytes(bitmap: list[list[int]]) -> tuple[bytes, int, int]:
@@ -52,18 +57,12 @@ def bitmap_to_bytes(bitmap: list[list[int]]) -> tuple[bytes, int, int]:
     # Pad width to multiple of 8
     padded_width = ((width + 7) // 8) * 8
     
-    data = []
+    data = bytearray()
     for row in bitmap:
-        # Pad row to multiple of 8
-        padded_row = row + [0] * (padded_width - len(row))
-        
-        # Convert to bytes (MSB first)
-        for byte_idx in range(padded_width // 8):
-            byte_val = 0
-            for bit_idx in range(8):
-                if padded_row[byte_idx * 8 + bit_idx]:
-                    byte_val |= (0x80 >> bit_idx)
-            data.append(byte_val)
+        # Spell the row out as ASCII '0'/'1', pad it to a multiple of 8 and let
+        # int() pack it MSB first in one go
+        bits = bytes(row).translate(BIT_DIGITS).ljust(padded_width, b'0')
+        data += int(bits or b'0', 2).to_bytes(padded_width // 8, 'big')
     
     return bytes(data), padded_width, height
 
@@ -84,7 +83,7 @@ def generate_rust_code(data: bytes, width: int, height: int, name: str = "FERRIS
         row_start = row_idx * bytes_per_row
         row_end = row_start + bytes_per_row
         row_bytes = data[row_start:row_end]
-        hex_str = ", ".join(f"0x{b:02X}" for b in row_bytes)
+        hex_str = ", ".join(map(HEX_LITERALS.__getitem__, row_bytes))
         lines.append(f"    {hex_str}, // Row {row_idx}")
     
     lines.append("];")
@@ -151,12 +150,8 @@ def main():
     # Resize with high-quality resampling
     img_resized = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
     
-    # Convert to monochrome bitmap
-    bitmap = image_to_mono_bitmap(img_resized, bg_threshold=240)
-    
-    # Invert if requested (for black icons on white background)
-    if args.invert:
-        bitmap = [[1 - p for p in row] for row in bitmap]
+    # Convert to monochrome bitmap, inverted if requested (for black icons on white background)
+    bitmap = image_to_mono_bitmap(img_resized, bg_threshold=240, invert=args.invert)
     
     # Print ASCII preview
     print_ascii_preview(bitmap)
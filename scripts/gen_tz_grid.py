@@ -27,20 +27,33 @@ Binary formats:
 DST transitions are generated for years 2025-2100 (inclusive).
 
 Usage:
-    uv run --with shapely,requests,tqdm,tzdata python scripts/gen_tz_grid.py
+    uv run --with shapely,numpy,ijson,requests,tqdm,tzdata python scripts/gen_tz_grid.py
 """
 
-import json
+import math
+import pickle
+import shutil
 import struct
+import tempfile
 import zipfile
-import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import accumulate
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+try:
+    from zoneinfo import _zoneinfo as _pyzoneinfo
+except ImportError:
+    _pyzoneinfo = None
+
+import ijson
+import numpy as np
 import requests
+import shapely
 from tqdm import tqdm
-from shapely.geometry import shape, Point
+from shapely.geometry import shape
 from shapely import STRtree
 from shapely.validation import make_valid
 
@@ -52,30 +65,42 @@ DST_START_YEAR = 2025
 DST_END_YEAR = 2100
 TRANSITION_STEP_HOURS = 6
 
+# On-disk record layouts; structured dtypes are packed, matching the firmware
+RLE_ENTRY = np.dtype([("count", "u1"), ("tz_id", "<u2")])
+TRANSITION_INDEX_ENTRY = np.dtype([("base_offset", "<i2"), ("first_index", "<u4"), ("count", "<u2")])
+TRANSITION_ENTRY = np.dtype([("utc_ts", "<u4"), ("offset_minutes", "<i2")])
+
 
-def download_timezone_data() -> dict:
-    """Download and cache full timezone boundary GeoJSON."""
+def download_timezone_data() -> Path:
+    """Download and cache full timezone boundary GeoJSON, returning the cache path."""
     CACHE_DIR.mkdir(exist_ok=True)
     cache_file = CACHE_DIR / "timezones-2025c.geojson"
     
     if cache_file.exists():
         print(f"Using cached data: {cache_file}")
-        with open(cache_file, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return cache_file
     
     print(f"Downloading full timezone data from {GEOJSON_URL}...")
     response = requests.get(GEOJSON_URL, stream=True)
     response.raise_for_status()
     
-    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
-        for name in zf.namelist():
-            if name.endswith('.geojson') or name.endswith('.json'):
-                print(f"Extracting {name}...")
-                with zf.open(name) as f:
-                    data = json.load(f)
-                    with open(cache_file, "w", encoding="utf-8") as cf:
-                        json.dump(data, cf)
-                    return data
+    # Spool the zip to disk rather than holding the whole download in memory
+    with tempfile.TemporaryFile() as tmp:
+        for chunk in response.iter_content(chunk_size=1 << 20):
+            tmp.write(chunk)
+        tmp.seek(0)
+        
+        with zipfile.ZipFile(tmp) as zf:
+            for name in zf.namelist():
+                if name.endswith('.geojson') or name.endswith('.json'):
+                    print(f"Extracting {name}...")
+                    # Cache the extracted bytes verbatim; they are only parsed
+                    # when the geometries are loaded
+                    partial_file = cache_file.with_suffix(".part")
+                    with zf.open(name) as f, open(partial_file, "wb") as cf:
+                        shutil.copyfileobj(f, cf, 1 << 20)
+                    partial_file.replace(cache_file)
+                    return cache_file
     
     raise RuntimeError("No geojson/json file found in zip")
 
@@ -90,16 +115,86 @@ def utc_offset_minutes(zone: ZoneInfo, utc_dt: datetime) -> int:
 
 def find_transition(zone: ZoneInfo, start: datetime, end: datetime, prev_offset: int) -> tuple[datetime, int]:
     """Binary search the first UTC time where the offset differs from prev_offset."""
-    lo = start
-    hi = end
-    while (hi - lo).total_seconds() > 1:
-        mid = lo + (hi - lo) / 2
-        if utc_offset_minutes(zone, mid) == prev_offset:
+    # Search whole Unix seconds; datetimes are only built to look up offsets
+    lo = int(start.timestamp())
+    hi = math.ceil(end.timestamp())
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if utc_offset_minutes(zone, datetime.fromtimestamp(mid, timezone.utc)) == prev_offset:
             lo = mid
         else:
             hi = mid
-    new_offset = utc_offset_minutes(zone, hi)
-    return hi, new_offset
+    hi_dt = datetime.fromtimestamp(hi, timezone.utc)
+    return hi_dt, utc_offset_minutes(zone, hi_dt)
+
+
+def tzif_transitions(tz_name: str) -> list[tuple[int, int]] | None:
+    """
+    Read the explicit (utc_seconds, offset_minutes) transitions from the TZif file.
+    
+    Uses the table the pure-Python zoneinfo implementation parses; returns None
+    if that implementation or its attributes are unavailable. The table ends at
+    the last explicit transition (usually 2037), later rules only live in the
+    POSIX TZ string.
+    """
+    if _pyzoneinfo is None:
+        return None
+    try:
+        zone = _pyzoneinfo.ZoneInfo(tz_name)
+        trans_utc, ttinfos = zone._trans_utc, zone._ttinfos
+        return [(int(ts), int(tti.utcoff.total_seconds() // 60)) for ts, tti in zip(trans_utc, ttinfos)]
+    except (AttributeError, TypeError):
+        return None
+
+
+def build_zone_transitions(tz_name: str, start: datetime, end: datetime, step: timedelta) -> tuple[int, list[tuple[int, int]]]:
+    """Find the base offset and transitions of one timezone between start and end."""
+    try:
+        zone = ZoneInfo(tz_name)
+    except ZoneInfoNotFoundError as exc:
+        raise RuntimeError(
+            f"ZoneInfo data missing for {tz_name}. Install the 'tzdata' package."
+        ) from exc
+
+    base_offset = utc_offset_minutes(zone, start)
+    prev_offset = base_offset
+    prev_time = start
+    tz_transitions: list[tuple[int, int]] = []
+
+    # Take the explicit transitions straight from the TZif table, then search
+    # only the years past its end
+    table = tzif_transitions(tz_name)
+    if table:
+        start_ts = int(start.timestamp())
+        end_ts = int(end.timestamp())
+        for ts, offset in table:
+            if ts <= start_ts or offset == prev_offset:
+                continue
+            if ts >= end_ts:
+                break
+            tz_transitions.append((ts, offset))
+            prev_offset = offset
+        last_ts = table[-1][0]
+        if last_ts > start_ts:
+            prev_time = min(datetime.fromtimestamp(last_ts, timezone.utc), end)
+
+    current = prev_time + step
+
+    while current <= end:
+        cur_offset = utc_offset_minutes(zone, current)
+        if cur_offset != prev_offset:
+            trans_time, new_offset = find_transition(zone, prev_time, current, prev_offset)
+            if trans_time >= end:
+                break
+            tz_transitions.append((int(trans_time.timestamp()), new_offset))
+            prev_time = trans_time
+            prev_offset = new_offset
+            current = prev_time + step
+            continue
+        prev_time = current
+        current += step
+
+    return base_offset, tz_transitions
 
 
 def build_transition_tables(tz_names: list[str]) -> tuple[list[tuple[int, int, int]], list[tuple[int, int]]]:
@@ -111,116 +206,127 @@ def build_transition_tables(tz_names: list[str]) -> tuple[list[tuple[int, int, i
     index_entries: list[tuple[int, int, int]] = []
     transitions: list[tuple[int, int]] = []
 
-    for tz_name in tqdm(tz_names, desc="Building DST transitions"):
-        try:
-            zone = ZoneInfo(tz_name)
-        except ZoneInfoNotFoundError as exc:
-            raise RuntimeError(
-                f"ZoneInfo data missing for {tz_name}. Install the 'tzdata' package."
-            ) from exc
-
-        base_offset = utc_offset_minutes(zone, start)
-        prev_offset = base_offset
-        prev_time = start
-        current = prev_time + step
-        tz_transitions: list[tuple[int, int]] = []
-
-        while current <= end:
-            cur_offset = utc_offset_minutes(zone, current)
-            if cur_offset != prev_offset:
-                trans_time, new_offset = find_transition(zone, prev_time, current, prev_offset)
-                if trans_time >= end:
-                    break
-                tz_transitions.append((int(trans_time.timestamp()), new_offset))
-                prev_time = trans_time
-                prev_offset = new_offset
-                current = prev_time + step
-                continue
-            prev_time = current
-            current += step
-
-        start_index = len(transitions)
-        transitions.extend(tz_transitions)
-        index_entries.append((base_offset, start_index, len(tz_transitions)))
+    # Zones are independent and the search is pure CPU, so fan out to processes
+    build_one = partial(build_zone_transitions, start=start, end=end, step=step)
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(build_one, tz_names, chunksize=8)
+        for base_offset, tz_transitions in tqdm(results, total=len(tz_names), desc="Building DST transitions"):
+            start_index = len(transitions)
+            transitions.extend(tz_transitions)
+            index_entries.append((base_offset, start_index, len(tz_transitions)))
 
     return index_entries, transitions
 
 
-def build_timezone_grid(geojson: dict) -> tuple[list[list[int]], list[str]]:
+def load_timezone_geometries() -> tuple[list, list[int], list[str]]:
     """
-    Build a 1x1 degree grid of timezone IDs.
+    Load validated timezone polygons, from the geometry cache when present.
+    
+    Features are streamed from the GeoJSON file, so only the geometries are
+    kept in memory rather than the whole parsed document. The result is
+    cached as WKB so later runs skip the download, parse and make_valid.
     
     Returns:
-        (grid, tz_names) where:
-        - grid[lat][lon] = tz_id
+        (geometries, geom_tz_ids, tz_names) where:
+        - geom_tz_ids[i] = tz_id of geometries[i]
         - tz_names[tz_id] = IANA timezone name
     """
-    features = geojson["features"]
+    CACHE_DIR.mkdir(exist_ok=True)
+    cache_file = CACHE_DIR / "timezones-2025c.geoms.pkl"
     
-    # Build timezone name table
-    tz_names = ["Etc/UTC"]  # tz_id 0 = ocean/unknown = UTC
-    tz_name_to_id: dict[str, int] = {"Etc/UTC": 0}
+    if cache_file.exists():
+        print(f"Using cached geometries: {cache_file}")
+        with open(cache_file, "rb") as f:
+            wkb, geom_tz_ids, tz_names = pickle.load(f)
+        geometries = list(shapely.from_wkb(wkb))
+        print(f"Found {len(tz_names)} unique timezones")
+        return geometries, geom_tz_ids, tz_names
+    
+    geojson_path = download_timezone_data()
     
-    print("Building spatial index...")
     geometries = []
-    geom_tz_ids = []
+    feature_tz_names = []
     
-    for feat in tqdm(features, desc="Loading geometries"):
-        tz_name = feat["properties"]["tzid"]
-        
-        # Get or create tz_id
-        if tz_name not in tz_name_to_id:
-            tz_name_to_id[tz_name] = len(tz_names)
-            tz_names.append(tz_name)
-        
-        tz_id = tz_name_to_id[tz_name]
-        
-        geom = shape(feat["geometry"])
-        if not geom.is_valid:
-            geom = make_valid(geom)
-        geometries.append(geom)
-        geom_tz_ids.append(tz_id)
+    with open(geojson_path, "rb") as f:
+        features = ijson.items(f, "features.item", use_float=True)
+        for feat in tqdm(features, desc="Loading geometries"):
+            feature_tz_names.append(feat["properties"]["tzid"])
+            
+            geom = shape(feat["geometry"])
+            if not geom.is_valid:
+                geom = make_valid(geom)
+            geometries.append(geom)
+    
+    # Build timezone name table in one pass: tz_ids are numbered in order of
+    # first appearance, with tz_id 0 = ocean/unknown = UTC
+    names, first, inverse = np.unique(
+        ["Etc/UTC", *feature_tz_names], return_index=True, return_inverse=True
+    )
+    order = np.argsort(first)
+    name_ids = np.empty_like(order)
+    name_ids[order] = np.arange(len(order))
+    tz_names = names[order].tolist()
+    geom_tz_ids = name_ids[inverse[1:]].tolist()
     
     print(f"Found {len(tz_names)} unique timezones")
     
-    tree = STRtree(geometries)
+    with open(cache_file, "wb") as f:
+        pickle.dump((shapely.to_wkb(geometries), geom_tz_ids, tz_names), f)
+    
+    return geometries, geom_tz_ids, tz_names
+
+
+def build_timezone_grid(geometries: list, geom_tz_ids: list[int]) -> np.ndarray:
+    """
+    Build a 1x1 degree grid of timezone IDs.
+    
+    Returns:
+        180x360 uint16 array with grid[lat][lon] = tz_id
+    """
+    print("Building spatial index...")
+    # A few hundred polygons: keep the fan-out small so leaves partition them
+    tree = STRtree(geometries, node_capacity=10)
     
-    # Build 180x360 grid
-    grid = [[0] * 360 for _ in range(180)]
+    # Build 180x360 grid: one point per cell centre, row-major from -90/-180
+    lat_centres = np.arange(180) - 90 + 0.5
+    lon_centres = np.arange(360) - 180 + 0.5
+    lon_grid, lat_grid = np.meshgrid(lon_centres, lat_centres)
+    cells = shapely.points(lon_grid.ravel(), lat_grid.ravel())
     
     print("Building grid...")
-    for lat_idx in tqdm(range(180), desc="Processing rows"):
-        lat = -90 + lat_idx + 0.5
-        
-        for lon_idx in range(360):
-            lon = -180 + lon_idx + 0.5
-            pt = Point(lon, lat)
-            
-            for idx in tree.query(pt):
-                if geometries[idx].contains(pt):
-                    grid[lat_idx][lon_idx] = geom_tz_ids[idx]
-                    break
+    # One bulk spatial join: pairs of (cell, geometry) where the geometry
+    # contains the cell centre
+    cell_idx, geom_idx = tree.query(cells, predicate="within")
+    
+    # Where polygons overlap, keep the first match in query order, as the
+    # per-point query did
+    cell_idx, first = np.unique(cell_idx, return_index=True)
     
-    return grid, tz_names
+    grid = np.zeros(180 * 360, dtype=np.uint16)
+    grid[cell_idx] = np.asarray(geom_tz_ids, dtype=np.uint16)[geom_idx[first]]
+    
+    return grid.reshape(180, 360)
 
 
-def rle_encode_row(row: list[int]) -> bytes:
+def rle_encode_row(row: np.ndarray) -> bytes:
     """RLE encode a single row. Each entry is (count: u8, tz_id: u16)."""
-    result = bytearray()
-    i = 0
-    while i < len(row):
-        value = row[i]
-        count = 1
-        while i + count < len(row) and row[i + count] == value and count < 255:
-            count += 1
-        result.append(count)
-        result.extend(struct.pack('<H', value))  # tz_id is u16
-        i += count
-    return bytes(result)
+    values = np.asarray(row, dtype=np.uint16)
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)])
+    
+    # Runs longer than 255 become full 255-long entries plus the remainder
+    full, rem = np.divmod(lengths, 255)
+    partial_run = rem > 0
+    pieces = full + partial_run
+    entries = np.empty(pieces.sum(), dtype=RLE_ENTRY)
+    entries["count"] = 255
+    entries["count"][np.cumsum(pieces)[partial_run] - 1] = rem[partial_run]
+    entries["tz_id"] = np.repeat(values[starts], pieces)
+    return entries.tobytes()
 
 
 def generate_files(
-    grid: list[list[int]],
+    grid: np.ndarray,
     tz_index_entries: list[tuple[int, int, int]],
     tz_transitions: list[tuple[int, int]],
 ):
@@ -236,31 +342,22 @@ def generate_files(
     print(f"Wrote {rle_file}: {len(rle_bin)} bytes")
     
     # 2. Row index: offset into RLE data for each row (u16)
-    row_offsets = []
-    offset = 0
-    for rle in rle_rows:
-        row_offsets.append(offset)
-        offset += len(rle)
-    
-    index_bin = b''.join(struct.pack('<H', off) for off in row_offsets)
+    row_offsets = list(accumulate((len(rle) for rle in rle_rows[:-1]), initial=0))
+    index_bin = np.array(row_offsets, dtype="<u2").tobytes()
     index_file = OUTPUT_DIR / "tz_row_index.bin"
     with open(index_file, 'wb') as f:
         f.write(index_bin)
     print(f"Wrote {index_file}: {len(index_bin)} bytes (180 rows)")
 
     # 3. Transition index: per-tz_id base offset + transitions slice info
-    index_data = bytearray()
-    for base_offset, first_index, count in tz_index_entries:
-        index_data.extend(struct.pack('<hIH', base_offset, first_index, count))
+    index_data = np.array(tz_index_entries, dtype=TRANSITION_INDEX_ENTRY).tobytes()
     tz_index_file = OUTPUT_DIR / "tz_transition_index.bin"
     with open(tz_index_file, 'wb') as f:
         f.write(index_data)
     print(f"Wrote {tz_index_file}: {len(index_data)} bytes ({len(tz_index_entries)} zones)")
 
     # 4. Transitions: (utc_ts: u32, offset_minutes: i16)
-    transitions_data = bytearray()
-    for ts, offset in tz_transitions:
-        transitions_data.extend(struct.pack('<Ih', ts, offset))
+    transitions_data = np.array(tz_transitions, dtype=TRANSITION_ENTRY).tobytes()
     tz_transitions_file = OUTPUT_DIR / "tz_transitions.bin"
     with open(tz_transitions_file, 'wb') as f:
         f.write(transitions_data)
@@ -272,7 +369,7 @@ def generate_files(
 
 
 def verify_files(
-    grid: list[list[int]],
+    grid: np.ndarray,
     tz_index_entries: list[tuple[int, int, int]],
     tz_transitions: list[tuple[int, int]],
 ):
@@ -305,20 +402,23 @@ def verify_files(
         parsed_transitions.append((ts, offset))
     assert parsed_transitions == tz_transitions, "Transitions data mismatch"
     
-    # Parse and verify each row
-    for lat_idx in range(180):
-        row_offset = struct.unpack('<H', index_data[lat_idx*2:lat_idx*2+2])[0]
-        
-        # Decode RLE
-        pos = row_offset
-        decoded = []
-        while len(decoded) < 360:
-            count = rle_data[pos]
-            tz_id = struct.unpack('<H', rle_data[pos+1:pos+3])[0]
-            decoded.extend([tz_id] * count)
-            pos += 3
-        
-        assert decoded == grid[lat_idx], f"Row {lat_idx} mismatch"
+    # Decode the whole RLE stream at once and check it against the grid
+    assert len(rle_data) % RLE_ENTRY.itemsize == 0, "RLE data length mismatch"
+    entries = np.frombuffer(rle_data, dtype=RLE_ENTRY)
+    counts = entries["count"].astype(np.int64)
+    
+    # Each row must start at an entry boundary that begins a new 360-cell row
+    row_offsets = np.frombuffer(index_data, dtype="<u2").astype(np.int64)
+    assert not (row_offsets % RLE_ENTRY.itemsize).any(), "Row index misaligned"
+    cells_before = np.r_[0, np.cumsum(counts)]
+    assert np.array_equal(
+        cells_before[row_offsets // RLE_ENTRY.itemsize], np.arange(180) * 360
+    ), "Row index mismatch"
+    
+    decoded = np.repeat(entries["tz_id"], counts)
+    assert decoded.size == grid.size, "RLE cell count mismatch"
+    bad_rows = np.flatnonzero((decoded.reshape(grid.shape) != grid).any(axis=1))
+    assert bad_rows.size == 0, f"Row {bad_rows[0]} mismatch"
     
     print("Verification passed!")
 
@@ -326,8 +426,8 @@ def verify_files(
 def main():
     print("=== Timezone Grid Generator (Full DST Support) ===\n")
     
-    geojson = download_timezone_data()
-    grid, tz_names = build_timezone_grid(geojson)
+    geometries, geom_tz_ids, tz_names = load_timezone_geometries()
+    grid = build_timezone_grid(geometries, geom_tz_ids)
     
     print("\nBuilding DST transitions...")
     tz_index_entries, tz_transitions = build_transition_tables(tz_names)
@@ -0,0 +1,64 @@
+import ast
+import copy
+import io
+import unittest
+from pathlib import Path
+
+import patch_ng
+
+ROOT = Path(__file__).resolve().parent.parent
+PATCH = ROOT / "patches" / "RingBuffer.h.patch"
+PATCHED = (ROOT / "patches" / "src" / "Ringbuffer.h").read_bytes()
+PRISTINE = PATCHED.replace(
+    b"#define SERIAL_BUFFER_SIZE 1024", b"#define SERIAL_BUFFER_SIZE 64"
+)
+
+
+def _load_patch_helpers():
+    """The patch helpers of extra_script.py, which only runs under SCons."""
+    tree = ast.parse((ROOT / "extra_script.py").read_text(encoding="utf-8"))
+    tree.body = [
+        node
+        for node in tree.body
+        if isinstance(node, ast.FunctionDef)
+        and node.name in ("_locate_hunks", "_patch_bytes")
+    ]
+    namespace = {"copy": copy, "io": io, "patch_ng": patch_ng}
+    exec(compile(tree, "extra_script.py", "exec"), namespace)
+    return namespace["_patch_bytes"]
+
+
+_patch_bytes = _load_patch_helpers()
+
+
+class PatchBytesTest(unittest.TestCase):
+    def test_applies_at_stated_line(self):
+        self.assertEqual(_patch_bytes(PRISTINE, str(PATCH)), (PATCHED, None))
+
+    def test_applies_to_shifted_file(self):
+        for shift in (b"// a\n// b\n// c\n", b""):
+            with self.subTest(shift=shift):
+                header, _, rest = PRISTINE.partition(b"\n")
+                shifted = header + b"\n" + shift + rest
+                patched, error = _patch_bytes(shifted, str(PATCH))
+                self.assertIsNone(error)
+                self.assertEqual(
+                    patched, shifted.replace(b"SIZE 64", b"SIZE 1024")
+                )
+
+    def test_applies_to_file_shifted_up(self):
+        lines = PRISTINE.splitlines(keepends=True)
+        shifted = b"".join(lines[3:])
+        patched, error = _patch_bytes(shifted, str(PATCH))
+        self.assertIsNone(error)
+        self.assertEqual(patched, shifted.replace(b"SIZE 64", b"SIZE 1024"))
+
+    def test_mismatched_context_is_an_error(self):
+        changed = PRISTINE.replace(b"#endif", b"#endif // SERIAL", 1)
+        patched, error = _patch_bytes(changed, str(PATCH))
+        self.assertIsNone(patched)
+        self.assertIn("did not apply", error)
+
+
+if __name__ == "__main__":
+    unittest.main()
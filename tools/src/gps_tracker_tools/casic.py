@@ -6,32 +6,134 @@ Supports GPS/BDS ephemeris, UTC, ionospheric data, AID-INI, and ACK/NACK message
 """
 
 import argparse
+import collections
+import concurrent.futures
 import csv
 import datetime
+import functools
+import itertools
+import mmap
+import os
 import struct
 import sys
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional
+
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+# AID-INI: lat, lon, alt, tow, freq bias, 3 accuracies, reserved, week,
+# timer source, flags
+_AID_INI = struct.Struct("<ddddffffIHBB")
+# Ephemeris payload prefix: SV ID, toe, toc
+_EPH_HEADER = struct.Struct("<III")
+# Frame header: magic, payload length, class ID, message ID
+_HEADER = struct.Struct("<HHBB")
+
+_CSV_BUFFER_SIZE = 1 << 20
+
+# "0x00".."0xFF", indexed by byte value
+_HEX2 = tuple(f"0x{i:02X}" for i in range(256))
+
+
+@functools.lru_cache(maxsize=64)
+def _words_struct(count: int) -> struct.Struct:
+    """Struct unpacking ``count`` little-endian u32 words in one call."""
+    return struct.Struct(f"<{count}I")
+
+
+@functools.lru_cache(maxsize=64)
+def _frame_struct(length: int) -> struct.Struct:
+    """Struct unpacking a ``length``-byte payload's words plus its checksum.
+
+    Trailing payload bytes that do not fill a word are skipped, matching
+    the checksum definition.
+    """
+    return struct.Struct(f"<{length >> 2}I{length & 3}xI")
+
+
+def _frame_checksums(
+    data, offset: int, class_id: int, message_id: int, length: int
+) -> tuple[int, int]:
+    """Return (stored, calculated) checksums of the frame at ``offset``."""
+    # Payload words and the trailing checksum come out of one unpack
+    frame = _frame_struct(length).unpack_from(data, offset + 6)
+    stored = frame[-1]
+    header = (message_id << 24) + (class_id << 16) + length
+    return stored, (sum(frame, header) - stored) & 0xFFFFFFFF
+
+
+def _verify_frames(
+    filepath: str, frames: list[tuple[int, int, int, int]]
+) -> list[tuple[int, int]]:
+    """Process-pool worker: checksum (offset, class, id, length) frames.
+
+    The file is mapped again in the worker so only offsets are pickled.
+    """
+    with open(filepath, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        return [_frame_checksums(data, *frame) for frame in frames]
+
+
+_UNPARSED = object()
 
 
 class CasicPacket:
     """CASIC data packet."""
 
+    __slots__ = (
+        "header",
+        "length",
+        "class_id",
+        "message_id",
+        "checksum",
+        "_buffer",
+        "_payload_start",
+        "_parsed",
+    )
+
     def __init__(self):
         self.header: int = 0
         self.length: int = 0
         self.class_id: int = 0
         self.message_id: int = 0
-        self.payload: bytes = b""
         self.checksum: int = 0
-        self.parsed_data: Optional[dict[str, Any]] = None
+        # Payload lives in _buffer at _payload_start (None: whole buffer)
+        self._buffer: Any = b""
+        self._payload_start: Optional[int] = None
+        self._parsed: Any = _UNPARSED
+
+    @property
+    def payload(self) -> memoryview:
+        """Payload bytes, sliced from the source buffer on access."""
+        view = memoryview(self._buffer)
+        start = self._payload_start
+        if start is None:
+            return view
+        return view[start : start + self.length]
+
+    @payload.setter
+    def payload(self, value: bytes) -> None:
+        self._buffer = value
+        self._payload_start = None
+
+    @property
+    def parsed_data(self) -> Optional[dict[str, Any]]:
+        """Decoded payload fields, parsed on first access."""
+        if self._parsed is _UNPARSED:
+            self._parsed = _PAYLOAD_PARSER.parse_message_payload(self)
+        return self._parsed
+
+    @parsed_data.setter
+    def parsed_data(self, value: Optional[dict[str, Any]]) -> None:
+        self._parsed = value
 
     def __str__(self):
         msg_type = CasicParser.get_message_name(
             self.class_id, self.message_id
         )
         return (
-            f"CASIC Packet: {msg_type} (Class=0x{self.class_id:02X}, "
-            f"ID=0x{self.message_id:02X}), "
+            f"CASIC Packet: {msg_type} (Class={_HEX2[self.class_id]}, "
+            f"ID={_HEX2[self.message_id]}), "
             f"Length={self.length}, "
             f"Checksum=0x{self.checksum:08X}"
         )
@@ -54,6 +156,11 @@ class CasicParser:
         (0x05, 0x01): "ACK",
         (0x05, 0x00): "NACK",
     }
+    # Same table keyed by (class << 8) | id, cheaper to hash than a tuple
+    _MESSAGE_NAMES = {
+        (class_id << 8) | message_id: name
+        for (class_id, message_id), name in MESSAGE_TYPES.items()
+    }
 
     def __init__(self):
         self.packets: list[CasicPacket] = []
@@ -66,8 +173,8 @@ class CasicParser:
 
     @staticmethod
     def get_message_name(class_id: int, message_id: int) -> str:
-        return CasicParser.MESSAGE_TYPES.get(
-            (class_id, message_id), "UNKNOWN"
+        return CasicParser._MESSAGE_NAMES.get(
+            (class_id << 8) | message_id, "UNKNOWN"
         )
 
     def calculate_checksum(
@@ -77,63 +184,37 @@ class CasicParser:
         length: int,
         payload: bytes,
     ) -> int:
-        checksum = (message_id << 24) + (class_id << 16) + length
-        payload_len = len(payload)
-        for i in range(0, payload_len // 4):
-            offset = i * 4
-            if offset + 4 <= payload_len:
-                payload_word = struct.unpack(
-                    "<I", payload[offset : offset + 4]
-                )[0]
-                checksum += payload_word
+        words = _words_struct(len(payload) >> 2).unpack_from(payload)
+        # Words are < 2**32, so one mask after the sum gives the u32 result
+        checksum = sum(words, (message_id << 24) + (class_id << 16) + length)
         return checksum & 0xFFFFFFFF
 
     def parse_message_payload(
         self, packet: CasicPacket
     ) -> dict[str, Any]:
-        msg_type = (packet.class_id, packet.message_id)
-
-        if msg_type == (0x0B, 0x01):
-            return self._parse_aid_ini(packet.payload)
-        elif msg_type == (0x05, 0x01):
-            return self._parse_ack_nack(packet.payload, is_ack=True)
-        elif msg_type == (0x05, 0x00):
-            return self._parse_ack_nack(packet.payload, is_ack=False)
-        elif msg_type == (0x08, 0x07):
-            return self._parse_gps_ephemeris(packet.payload)
-        elif msg_type == (0x08, 0x02):
-            return self._parse_bds_ephemeris(packet.payload)
-        elif msg_type == (0x08, 0x00):
-            return self._parse_simple(packet.payload, "BDS_UTC", 20)
-        elif msg_type == (0x08, 0x01):
-            return self._parse_simple(
-                packet.payload, "BDS_IONOSPHERIC", 16
-            )
-        elif msg_type == (0x08, 0x05):
-            return self._parse_simple(packet.payload, "GPS_UTC", 20)
-        elif msg_type == (0x08, 0x06):
-            return self._parse_simple(
-                packet.payload, "GPS_IONOSPHERIC", 16
-            )
-        else:
-            return {"raw_data": packet.payload.hex()}
+        handler = self._HANDLERS.get(
+            (packet.class_id << 8) | packet.message_id, CasicParser._parse_raw
+        )
+        return handler(self, packet.payload)
 
-    def _parse_aid_ini(self, payload: bytes) -> dict[str, Any]:
+    def _parse_aid_ini(self, payload: memoryview) -> dict[str, Any]:
         if len(payload) < 56:
             return {"error": "AID-INI payload too short"}
         try:
-            lat = struct.unpack("<d", payload[0:8])[0]
-            lon = struct.unpack("<d", payload[8:16])[0]
-            alt = struct.unpack("<d", payload[16:24])[0]
-            tow = struct.unpack("<d", payload[24:32])[0]
-            freq_bias = struct.unpack("<f", payload[32:36])[0]
-            p_acc = struct.unpack("<f", payload[36:40])[0]
-            t_acc = struct.unpack("<f", payload[40:44])[0]
-            f_acc = struct.unpack("<f", payload[44:48])[0]
-            res = struct.unpack("<I", payload[48:52])[0]
-            wn = struct.unpack("<H", payload[52:54])[0]
-            timer_source = payload[54]
-            flags = payload[55]
+            (
+                lat,
+                lon,
+                alt,
+                tow,
+                freq_bias,
+                p_acc,
+                t_acc,
+                f_acc,
+                res,
+                wn,
+                timer_source,
+                flags,
+            ) = _AID_INI.unpack_from(payload)
             return {
                 "latitude": lat,
                 "longitude": lon,
@@ -160,28 +241,26 @@ class CasicParser:
             return {"error": f"Failed to parse AID-INI: {e}"}
 
     def _parse_ack_nack(
-        self, payload: bytes, is_ack: bool
+        self, payload: memoryview, is_ack: bool
     ) -> dict[str, Any]:
         if len(payload) < 4:
             return {"error": "ACK/NACK payload too short"}
         cls_id = payload[0]
         msg_id = payload[1]
-        res = struct.unpack("<H", payload[2:4])[0]
+        res = _U16.unpack_from(payload, 2)[0]
         return {
             "type": "ACK" if is_ack else "NACK",
-            "acknowledged_class": f"0x{cls_id:02X}",
-            "acknowledged_message": f"0x{msg_id:02X}",
+            "acknowledged_class": _HEX2[cls_id],
+            "acknowledged_message": _HEX2[msg_id],
             "acknowledged_type": self.get_message_name(cls_id, msg_id),
             "reserved": res,
         }
 
-    def _parse_gps_ephemeris(self, payload: bytes) -> dict[str, Any]:
+    def _parse_gps_ephemeris(self, payload: memoryview) -> dict[str, Any]:
         if len(payload) < 72:
             return {"error": "GPS Ephemeris payload too short"}
         try:
-            svid = struct.unpack("<I", payload[0:4])[0]
-            toe = struct.unpack("<I", payload[4:8])[0]
-            toc = struct.unpack("<I", payload[8:12])[0]
+            svid, toe, toc = _EPH_HEADER.unpack_from(payload)
             return {
                 "type": "GPS_EPHEMERIS",
                 "satellite_id": svid & 0xFF,
@@ -201,13 +280,11 @@ class CasicParser:
                 "length": len(payload),
             }
 
-    def _parse_bds_ephemeris(self, payload: bytes) -> dict[str, Any]:
+    def _parse_bds_ephemeris(self, payload: memoryview) -> dict[str, Any]:
         if len(payload) < 92:
             return {"error": "BDS Ephemeris payload too short"}
         try:
-            svid = struct.unpack("<I", payload[0:4])[0]
-            toe = struct.unpack("<I", payload[4:8])[0]
-            toc = struct.unpack("<I", payload[8:12])[0]
+            svid, toe, toc = _EPH_HEADER.unpack_from(payload)
             return {
                 "type": "BDS_EPHEMERIS",
                 "satellite_id": svid & 0xFF,
@@ -228,7 +305,7 @@ class CasicParser:
             }
 
     def _parse_simple(
-        self, payload: bytes, type_name: str, min_len: int
+        self, payload: memoryview, type_name: str, min_len: int
     ) -> dict[str, Any]:
         if len(payload) < min_len:
             return {"error": f"{type_name} payload too short"}
@@ -238,12 +315,46 @@ class CasicParser:
             "raw_data": payload.hex(),
         }
 
-    def parse_file(self, filepath: str) -> bool:
+    def _parse_raw(self, payload: memoryview) -> dict[str, Any]:
+        return {"raw_data": payload.hex()}
+
+    # Keyed by (class << 8) | id, like _MESSAGE_NAMES
+    _HANDLERS = {
+        0x0B01: _parse_aid_ini,
+        0x0501: functools.partial(_parse_ack_nack, is_ack=True),
+        0x0500: functools.partial(_parse_ack_nack, is_ack=False),
+        0x0807: _parse_gps_ephemeris,
+        0x0802: _parse_bds_ephemeris,
+        0x0800: functools.partial(
+            _parse_simple, type_name="BDS_UTC", min_len=20
+        ),
+        0x0801: functools.partial(
+            _parse_simple, type_name="BDS_IONOSPHERIC", min_len=16
+        ),
+        0x0805: functools.partial(
+            _parse_simple, type_name="GPS_UTC", min_len=20
+        ),
+        0x0806: functools.partial(
+            _parse_simple, type_name="GPS_IONOSPHERIC", min_len=16
+        ),
+    }
+
+    def parse_file(self, filepath: str, jobs: int = 1) -> bool:
+        """Parse ``filepath``; ``jobs`` > 1 verifies checksums in parallel."""
         try:
             with open(filepath, "rb") as f:
-                data = f.read()
-                self.stats["total_bytes"] = len(data)
-                return self.parse_data(data)
+                size = os.fstat(f.fileno()).st_size
+                self.stats["total_bytes"] = size
+                if size == 0:  # mmap refuses empty files
+                    return self.parse_data(b"")
+                # Left open: packet payloads are views into the mapping
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if jobs <= 1:
+                    return self.parse_data(data)
+                first = len(self.packets)
+                self.parse_data(data, verify=False)
+                self._verify_parallel(filepath, self.packets[first:], jobs)
+                return True
         except FileNotFoundError:
             print(f"Error: file '{filepath}' not found")
             return False
@@ -251,88 +362,140 @@ class CasicParser:
             print(f"Error reading file: {e}")
             return False
 
-    def parse_data(self, data: bytes) -> bool:
+    def parse_data(self, data: bytes, verify: bool = True) -> bool:
+        self.packets.extend(self.iter_packets(data, verify))
+        return True
+
+    def iter_packets(
+        self, data: bytes, verify: bool = True
+    ) -> Iterator[CasicPacket]:
+        """Yield packets from ``data`` as they are scanned.
+
+        Nothing is retained on the parser; ``stats`` is updated as the
+        iterator advances. Payloads are views into ``data``.
+        """
+        view = memoryview(data)
+        # Only headers with room for a minimal packet after them can match
+        scan_end = max(
+            len(data) - self.MIN_PACKET_SIZE + len(self.HEADER_MAGIC), 0
+        )
+        # Hot loop: bind attribute lookups to locals once
+        find = data.find
+        magic = self.HEADER_MAGIC
+        probe_at = self._probe
+        materialize = self._materialize
+        stats = self.stats
         offset = 0
-        while offset < len(data):
-            header_pos = data.find(self.HEADER_MAGIC, offset)
+        while True:
+            header_pos = find(magic, offset, scan_end)
             if header_pos == -1:
                 break
-            if header_pos + self.MIN_PACKET_SIZE > len(data):
-                break
             try:
-                packet = self._parse_packet_at(data, header_pos)
-                if packet:
-                    self.packets.append(packet)
-                    self.stats["valid_packets"] += 1
-                    offset = header_pos + 6 + packet.length + 4
-                else:
-                    self.stats["invalid_packets"] += 1
-                    offset = header_pos + 1
+                probe = probe_at(view, header_pos, verify)
             except Exception as e:
                 print(f"Warning: parse error at offset {header_pos}: {e}")
-                self.stats["invalid_packets"] += 1
+                probe = None
+            if probe is None:
+                stats["invalid_packets"] += 1
                 offset = header_pos + 1
-        return True
-
-    def _parse_packet_at(
-        self, data: bytes, offset: int
-    ) -> Optional[CasicPacket]:
-        packet = CasicPacket()
-        packet.header = struct.unpack(
-            "<H", data[offset : offset + 2]
-        )[0]
-        packet.length = struct.unpack(
-            "<H", data[offset + 2 : offset + 4]
-        )[0]
-        packet.class_id = data[offset + 4]
-        packet.message_id = data[offset + 5]
-
-        total_packet_size = 6 + packet.length + 4
-        if offset + total_packet_size > len(data):
+                continue
+            stats["valid_packets"] += 1
+            offset = header_pos + 6 + probe[1] + 4
+            yield materialize(view, header_pos, probe)
+
+    def _probe(
+        self, data: memoryview, offset: int, verify: bool = True
+    ) -> Optional[tuple[int, int, int, int, int]]:
+        """Validate the frame at ``offset`` straight from the buffer.
+
+        Returns (header, length, class_id, message_id, checksum), or None
+        if the frame runs past the end of ``data``.
+        """
+        header, length, class_id, message_id = _HEADER.unpack_from(
+            data, offset
+        )
+        if offset + 6 + length + 4 > len(data):
             return None
+        checksum = 0
+        if verify:
+            checksum, calculated = _frame_checksums(
+                data, offset, class_id, message_id, length
+            )
+            if calculated != checksum:
+                self._checksum_error(offset, calculated, checksum)
+        return header, length, class_id, message_id, checksum
 
-        payload_start = offset + 6
-        payload_end = payload_start + packet.length
-        packet.payload = data[payload_start:payload_end]
-
-        checksum_start = payload_end
-        packet.checksum = struct.unpack(
-            "<I", data[checksum_start : checksum_start + 4]
-        )[0]
-
-        calculated_checksum = self.calculate_checksum(
+    @staticmethod
+    def _materialize(
+        data: memoryview, offset: int, probe: tuple[int, int, int, int, int]
+    ) -> CasicPacket:
+        packet = CasicPacket()
+        (
+            packet.header,
+            packet.length,
             packet.class_id,
             packet.message_id,
-            packet.length,
-            packet.payload,
+            packet.checksum,
+        ) = probe
+        packet._buffer = data
+        packet._payload_start = offset + 6
+        return packet
+
+    def _checksum_error(self, offset: int, calculated: int, stored: int):
+        self.stats["checksum_errors"] += 1
+        print(
+            f"Warning: checksum error at offset {offset}: "
+            f"calc=0x{calculated:08X}, "
+            f"got=0x{stored:08X}"
         )
-        if calculated_checksum != packet.checksum:
-            self.stats["checksum_errors"] += 1
-            print(
-                f"Warning: checksum error at offset {offset}: "
-                f"calc=0x{calculated_checksum:08X}, "
-                f"got=0x{packet.checksum:08X}"
-            )
 
-        packet.parsed_data = self.parse_message_payload(packet)
-        return packet
+    def _verify_parallel(
+        self, filepath: str, packets: list[CasicPacket], jobs: int
+    ):
+        """Checksum already-scanned packets across ``jobs`` processes.
+
+        Frame boundaries depend only on the length fields, so the scan
+        stays sequential and just the per-frame checksums are farmed out.
+        """
+        frames = [
+            (p._payload_start - 6, p.class_id, p.message_id, p.length)
+            for p in packets
+        ]
+        batch = max(1, -(-len(frames) // (jobs * 4)))
+        batches = [
+            frames[i : i + batch] for i in range(0, len(frames), batch)
+        ]
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            results = itertools.chain.from_iterable(
+                pool.map(_verify_frames, itertools.repeat(filepath), batches)
+            )
+            for packet, frame, (stored, calculated) in zip(
+                packets, frames, results
+            ):
+                packet.checksum = stored
+                if calculated != stored:
+                    self._checksum_error(frame[0], calculated, stored)
+
+    def print_summary(
+        self, packets: Optional[Iterable[CasicPacket]] = None
+    ):
+        # Counted first so a streamed iterable has updated stats by now
+        class_stats = collections.Counter(
+            (packet.class_id, packet.message_id)
+            for packet in (self.packets if packets is None else packets)
+        )
 
-    def print_summary(self):
         print("\n=== Parse Summary ===")
         print(f"Total bytes: {self.stats['total_bytes']}")
         print(f"Valid packets: {self.stats['valid_packets']}")
         print(f"Invalid packets: {self.stats['invalid_packets']}")
         print(f"Checksum errors: {self.stats['checksum_errors']}")
 
-        if self.packets:
+        if class_stats:
             print("\n=== Packet Type Statistics ===")
-            class_stats: dict[tuple[int, int], int] = {}
-            for packet in self.packets:
-                key = (packet.class_id, packet.message_id)
-                class_stats[key] = class_stats.get(key, 0) + 1
             for (class_id, msg_id), count in sorted(class_stats.items()):
                 print(
-                    f"Class 0x{class_id:02X}, ID 0x{msg_id:02X}: {count}"
+                    f"Class {_HEX2[class_id]}, ID {_HEX2[msg_id]}: {count}"
                 )
 
     def print_packets(
@@ -350,24 +513,31 @@ class CasicParser:
         for i, packet in enumerate(packets_to_show):
             print(f"[{i + 1:4d}] {packet}")
             if verbose:
-                if packet.parsed_data:
-                    _print_parsed_data(packet.parsed_data, indent="       ")
-                if packet.payload:
-                    payload_preview = packet.payload[:32]
-                    hex_str = " ".join(
-                        f"{b:02X}" for b in payload_preview
-                    )
-                    if len(packet.payload) > 32:
-                        hex_str += "..."
+                parsed = packet.parsed_data
+                if parsed:
+                    _print_parsed_data(parsed, indent="       ")
+                payload = packet.payload
+                if payload:
                     print(
-                        f"       Raw Payload ({len(packet.payload)} bytes): {hex_str}"
+                        f"       Raw Payload ({len(payload)} bytes): "
+                        f"{_format_payload_preview(payload)}"
                     )
 
         if limit and len(self.packets) > limit:
             print(f"... {len(self.packets) - limit} more packets")
 
-    def export_to_csv(self, output_file: str):
-        with open(output_file, "w", newline="", encoding="utf-8") as f:
+    def export_to_csv(
+        self,
+        output_file: str,
+        packets: Optional[Iterable[CasicPacket]] = None,
+    ):
+        with open(
+            output_file,
+            "w",
+            newline="",
+            encoding="utf-8",
+            buffering=_CSV_BUFFER_SIZE,
+        ) as f:
             writer = csv.writer(f)
             writer.writerow(
                 [
@@ -381,52 +551,46 @@ class CasicParser:
                     "Payload(Hex)",
                 ]
             )
-            for i, packet in enumerate(self.packets):
-                msg_type = self.get_message_name(
-                    packet.class_id, packet.message_id
-                )
-                payload_hex = (
-                    packet.payload.hex().upper()
-                    if packet.payload
-                    else ""
-                )
-                parse_status = (
-                    "OK"
-                    if packet.parsed_data
-                    and "error" not in packet.parsed_data
-                    else "FAIL"
-                )
-                writer.writerow(
-                    [
-                        i + 1,
-                        msg_type,
-                        f"0x{packet.class_id:02X}",
-                        f"0x{packet.message_id:02X}",
-                        packet.length,
-                        f"0x{packet.checksum:08X}",
-                        parse_status,
-                        payload_hex,
-                    ]
-                )
+            writer.writerows(
+                self._csv_rows(self.packets if packets is None else packets)
+            )
         print(f"Exported to: {output_file}")
 
-    def analyze_agnss_session(self):
+    def _csv_rows(self, packets: Iterable[CasicPacket]):
+        for i, packet in enumerate(packets, 1):
+            parsed = packet.parsed_data
+            yield (
+                i,
+                self.get_message_name(packet.class_id, packet.message_id),
+                _HEX2[packet.class_id],
+                _HEX2[packet.message_id],
+                packet.length,
+                f"0x{packet.checksum:08X}",
+                "OK" if parsed and "error" not in parsed else "FAIL",
+                packet.payload.hex().upper(),
+            )
+
+    def analyze_agnss_session(
+        self, packets: Optional[Iterable[CasicPacket]] = None
+    ):
         print("\n=== AGNSS Session Analysis ===")
 
-        by_type = {}
-        for p in self.packets:
+        counts: collections.Counter[tuple[int, int]] = collections.Counter()
+        ephemerides: dict[tuple[int, int], list[CasicPacket]] = {
+            (0x08, 0x07): [],
+            (0x08, 0x02): [],
+        }
+        for p in self.packets if packets is None else packets:
             key = (p.class_id, p.message_id)
-            by_type.setdefault(key, []).append(p)
-
-        aid_ini = by_type.get((0x0B, 0x01), [])
-        acks = by_type.get((0x05, 0x01), [])
-        nacks = by_type.get((0x05, 0x00), [])
-        gps_eph = by_type.get((0x08, 0x07), [])
-        bds_eph = by_type.get((0x08, 0x02), [])
-
-        print(f"AID-INI: {len(aid_ini)}")
-        print(f"ACK: {len(acks)}")
-        print(f"NACK: {len(nacks)}")
+            counts[key] += 1
+            if key in ephemerides:
+                ephemerides[key].append(p)
+        gps_eph = ephemerides[(0x08, 0x07)]
+        bds_eph = ephemerides[(0x08, 0x02)]
+
+        print(f"AID-INI: {counts[(0x0B, 0x01)]}")
+        print(f"ACK: {counts[(0x05, 0x01)]}")
+        print(f"NACK: {counts[(0x05, 0x00)]}")
         print(f"GPS Ephemeris: {len(gps_eph)}")
         print(f"BDS Ephemeris: {len(bds_eph)}")
 
@@ -457,11 +621,11 @@ class CasicParser:
         )
         packet_bytes = bytearray()
         packet_bytes.extend(self.HEADER_MAGIC)
-        packet_bytes.extend(struct.pack("<H", length))
+        packet_bytes.extend(_U16.pack(length))
         packet_bytes.append(class_id)
         packet_bytes.append(message_id)
         packet_bytes.extend(payload)
-        packet_bytes.extend(struct.pack("<I", checksum))
+        packet_bytes.extend(_U32.pack(checksum))
         return bytes(packet_bytes)
 
     def create_dummy_aid_ini(self) -> bytes:
@@ -480,8 +644,7 @@ class CasicParser:
 
         flags = 0b01100010
 
-        payload = struct.pack(
-            "<ddddffffIHBB",
+        payload = _AID_INI.pack(
             latitude,
             longitude,
             altitude,
@@ -527,7 +690,8 @@ class CasicParser:
                 )
                 f.write(
                     f"    // Packet {i + 1}: {msg_type} "
-                    f"(Class=0x{packet.class_id:02X}, ID=0x{packet.message_id:02X})\n"
+                    f"(Class={_HEX2[packet.class_id]}, "
+                    f"ID={_HEX2[packet.message_id]})\n"
                 )
                 f.write("    {\n")
                 _write_cpp_hex_lines(f, packet_bytes)
@@ -549,6 +713,10 @@ class CasicParser:
         ]
 
 
+# Payload decoding is stateless; lazily parsed packets share this instance.
+_PAYLOAD_PARSER = CasicParser()
+
+
 def _print_parsed_data(
     data: dict[str, Any], indent: str = ""
 ) -> None:
@@ -574,10 +742,15 @@ def _print_parsed_data(
             print(f"{indent}{key}: {value}")
 
 
+def _format_payload_preview(payload: memoryview, limit: int = 32) -> str:
+    preview = payload[:limit].hex(" ").upper()
+    return preview + "..." if len(payload) > limit else preview
+
+
 def _write_cpp_hex_lines(f, data: bytes) -> None:
     for j in range(0, len(data), 16):
         chunk = data[j : j + 16]
-        hex_values = ", ".join(f"0x{b:02X}" for b in chunk)
+        hex_values = ", ".join([_HEX2[b] for b in chunk])
         if j + 16 < len(data):
             f.write(f"        {hex_values},\n")
         else:
@@ -605,6 +778,14 @@ def add_subcommands(subparsers) -> None:
         metavar="N",
         help="Limit displayed packets",
     )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Verify checksums with N worker processes (default: 1)",
+    )
     p.add_argument(
         "-o", "--output", metavar="FILE", help="Export to CSV"
     )
@@ -638,7 +819,7 @@ def cmd_parse(args):
     """Parse a CASIC binary file."""
     parser = CasicParser()
     print(f"Parsing: {args.filepath}")
-    if not parser.parse_file(args.filepath):
+    if not parser.parse_file(args.filepath, jobs=args.jobs):
         sys.exit(1)
 
     if args.filter:
@@ -41,6 +41,7 @@ def cmd_fetch(args):
                 private_key=None,
                 symmetric_key=None,
                 epoch=None,
+                key_cache=args.key_cache,
                 hours=args.hours,
                 auth=args.auth,
                 anisette_url=args.anisette_url,
@@ -178,6 +179,18 @@ Examples:
         default=DEFAULT_ANISETTE_URL,
         help=f"Anisette v3 server URL (default: {DEFAULT_ANISETTE_URL})",
     )
+    p_fetch.add_argument(
+        "--key-cache",
+        default=findmy.DEFAULT_KEY_CACHE,
+        help=f"Apple derived key cache (default: {findmy.DEFAULT_KEY_CACHE})",
+    )
+    p_fetch.add_argument(
+        "--no-key-cache",
+        dest="key_cache",
+        action="store_const",
+        const=None,
+        help="Derive every Apple key without reading or writing the cache",
+    )
     p_fetch.add_argument(
         "--token-cache",
         default=DEFAULT_TOKEN_CACHE,
@@ -21,16 +21,23 @@ For 'fetch' mode, you also need:
 
 import argparse
 import base64
+import binascii
 import datetime
 import hashlib
 import json
 import os
+import sqlite3
 import struct
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Iterator
 
 DEFAULT_AUTH_PATH = "~/.config/gps-tracker/auth.json"
 DEFAULT_ANISETTE_URL = "http://localhost:6969"
+DEFAULT_KEY_CACHE = "~/.cache/gps-tracker/findmy_keys.sqlite"
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import ec
@@ -38,6 +45,10 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 from gps_tracker_tools.gpx import dedupe_reports, reports_to_gpx, write_gpx
 
+# Shared curve and backend objects, built once rather than per key/report
+_CURVE = ec.SECP224R1()
+_BACKEND = default_backend()
+
 # P-224 curve order
 P224_ORDER = (
     0xFFFFFFFFFFFFFFFFFFFFFFFFFFFF16A2E0B8F03E13DD29455C5C2A3D
@@ -51,6 +62,12 @@ APPLE_EPOCH = 978307200
 
 # Max key hashes per Apple API request to avoid truncated results.
 FETCH_BATCH_SIZE = 10
+# Minimum gap between the starts of two Apple requests; the endpoint is
+# rate limited
+FETCH_INTERVAL_SECS = 1
+
+# Windows with fewer keys are derived in-process; starting a pool costs more
+PARALLEL_DERIVE_MIN_KEYS = 2048
 
 
 # ---------------------------------------------------------------------------
@@ -77,6 +94,21 @@ def kdf_x963(
     return result[:output_len]
 
 
+def _sk_update(sk: bytes) -> bytes:
+    """SK_{i+1} = kdf_x963(SK_i, b"update", 32), a single SHA-256."""
+    return hashlib.sha256(sk + b"\x00\x00\x00\x01update").digest()
+
+
+def _sk_diversify(sk: bytes) -> tuple[bytes, bytes]:
+    """Split kdf_x963(SK_i, b"diversify", 72) into (u_i, v_i), 36 bytes each."""
+    out = (
+        hashlib.sha256(sk + b"\x00\x00\x00\x01diversify").digest()
+        + hashlib.sha256(sk + b"\x00\x00\x00\x02diversify").digest()
+        + hashlib.sha256(sk + b"\x00\x00\x00\x03diversify").digest()[:8]
+    )
+    return out[:36], out[36:]
+
+
 # ---------------------------------------------------------------------------
 # P-224 scalar arithmetic — matches firmware bytes_to_scalar / _nonzero
 # ---------------------------------------------------------------------------
@@ -84,11 +116,12 @@ def kdf_x963(
 
 def bytes_to_scalar(data: bytes) -> int:
     """Convert bytes to P-224 scalar: take first 28 bytes, big-endian, reduce mod q."""
-    if len(data) >= 28:
-        buf = data[:28]
-    else:
-        buf = b"\x00" * (28 - len(data)) + data
-    return int.from_bytes(buf, "big") % P224_ORDER
+    # Shifting off the trailing bytes is cheaper than slicing a copy; short
+    # inputs need no explicit zero-padding for a big-endian read
+    n = int.from_bytes(data, "big")
+    if len(data) > 28:
+        n >>= 8 * (len(data) - 28)
+    return n % P224_ORDER
 
 
 def bytes_to_scalar_nonzero(data: bytes) -> int:
@@ -107,6 +140,28 @@ def counter_at(ts: int, epoch: int) -> int:
     return (ts // KEY_ROTATION_SECS) - (epoch // KEY_ROTATION_SECS)
 
 
+def derive_key_from_sk(d0: int, sk: bytes) -> tuple[int, bytes]:
+    """Derive the rolling key pair for an already-advanced SK_counter.
+
+    `d0` is the master private scalar (bytes_to_scalar(master_private)).
+    Returns (private_key_int, public_key_x_bytes).
+    """
+    # Diversify to get u_i (36B) and v_i (36B)
+    u_bytes, v_bytes = _sk_diversify(sk)
+
+    # Scalar arithmetic — d_i = d0 * u_i + v_i (mod q)
+    u_i = bytes_to_scalar_nonzero(u_bytes)
+    v_i = bytes_to_scalar_nonzero(v_bytes)
+    d_i = (d0 * u_i + v_i) % P224_ORDER
+
+    # P_i = d_i * G
+    priv_key = ec.derive_private_key(d_i, _CURVE, _BACKEND)
+    x = priv_key.public_key().public_numbers().x
+    x_bytes = x.to_bytes(28, "big")
+
+    return d_i, x_bytes
+
+
 def derive_key_at(
     master_private: bytes, sk0: bytes, counter: int
 ) -> tuple[int, bytes]:
@@ -114,28 +169,219 @@ def derive_key_at(
 
     Returns (private_key_int, public_key_x_bytes).
     """
-    # Step 1: Iteratively derive SK_counter
+    # Iteratively derive SK_counter
     sk = sk0
     for _ in range(counter):
-        sk = kdf_x963(sk, b"update", 32)
+        sk = _sk_update(sk)
 
-    # Step 2: Diversify to get u_i (36B) and v_i (36B)
-    diversified = kdf_x963(sk, b"diversify", 72)
-    u_bytes = diversified[:36]
-    v_bytes = diversified[36:72]
+    return derive_key_from_sk(bytes_to_scalar(master_private), sk)
 
-    # Step 3: Scalar arithmetic — d_i = d0 * u_i + v_i (mod q)
-    d0 = bytes_to_scalar(master_private)
-    u_i = bytes_to_scalar_nonzero(u_bytes)
-    v_i = bytes_to_scalar_nonzero(v_bytes)
-    d_i = (d0 * u_i + v_i) % P224_ORDER
 
-    # Step 4: P_i = d_i * G
-    priv_key = ec.derive_private_key(d_i, ec.SECP224R1(), default_backend())
-    x = priv_key.public_key().public_numbers().x
-    x_bytes = x.to_bytes(28, "big")
+def iter_derive_keys(
+    master_private: bytes, sk0: bytes, counter_start: int, counter_end: int
+) -> Iterator[tuple[int, int, bytes]]:
+    """Derive rolling key pairs for counters counter_start..counter_end.
 
-    return d_i, x_bytes
+    Walks the SK chain once instead of restarting it from SK_0 for every
+    counter as repeated derive_key_at() calls would.
+    Yields (counter, private_key_int, public_key_x_bytes).
+    """
+    return _iter_keys_at(
+        bytes_to_scalar(master_private),
+        sk0,
+        0,
+        range(counter_start, counter_end + 1),
+    )
+
+
+def _iter_keys_at(
+    d0: int, sk: bytes, sk_counter: int, counters
+) -> Iterator[tuple[int, int, bytes]]:
+    """Derive keys for ascending `counters`, given `sk` = SK_sk_counter."""
+    for i in counters:
+        for _ in range(i - sk_counter):
+            sk = _sk_update(sk)
+        sk_counter = i
+        d_i, x_i = derive_key_from_sk(d0, sk)
+        yield i, d_i, x_i
+
+
+def derive_keys(
+    master_private: bytes,
+    sk0: bytes,
+    counter_start: int,
+    counter_end: int,
+    workers: int | None = None,
+    cache_path: str | None = None,
+) -> list[tuple[int, int, bytes]]:
+    """Derive rolling key pairs for counters counter_start..counter_end.
+
+    With `cache_path`, keys already in that SQLite cache are reused and only
+    the missing counters are derived (and then stored). A cache that cannot
+    be opened, read or written is skipped with a warning.
+
+    Large sets of keys are split into shards derived in parallel by
+    `workers` processes (default: one per CPU). The SK chain is walked once
+    here to give each shard its starting SK; the P-224 point
+    multiplications run in the workers.
+    Returns [(counter, private_key_int, public_key_x_bytes), ...].
+    """
+    counters = range(counter_start, counter_end + 1)
+    keys = {}
+    cache = None
+    if cache_path:
+        try:
+            cache = _open_key_cache(cache_path)
+            keys = _load_cached_keys(cache, master_private, sk0, counters)
+        except (OSError, sqlite3.Error) as e:
+            print(
+                f"Warning: key cache {cache_path} unavailable ({e}), "
+                "deriving all keys",
+                file=sys.stderr,
+            )
+            if cache:
+                cache.close()
+                cache = None
+    try:
+        missing = [i for i in counters if i not in keys]
+        derived = _derive_counters(master_private, sk0, missing, workers)
+        if cache and derived:
+            try:
+                _store_cached_keys(cache, master_private, sk0, derived)
+            except sqlite3.Error as e:
+                print(
+                    f"Warning: could not update key cache {cache_path}: {e}",
+                    file=sys.stderr,
+                )
+    finally:
+        if cache:
+            cache.close()
+
+    for i, d_i, x_i in derived:
+        keys[i] = (d_i, x_i)
+    return [(i, *keys[i]) for i in counters]
+
+
+def _derive_counters(
+    master_private: bytes,
+    sk0: bytes,
+    counters: list[int],
+    workers: int | None,
+) -> list[tuple[int, int, bytes]]:
+    """Derive keys for ascending `counters`, in worker processes if many."""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(counters) < PARALLEL_DERIVE_MIN_KEYS:
+        return _derive_shard(master_private, sk0, 0, counters)
+
+    shard_size = -(-len(counters) // workers)
+    shards = [
+        counters[i : i + shard_size]
+        for i in range(0, len(counters), shard_size)
+    ]
+
+    shard_sks = []
+    sk = sk0
+    sk_counter = 0
+    for shard in shards:
+        for _ in range(shard[0] - sk_counter):
+            sk = _sk_update(sk)
+        sk_counter = shard[0]
+        shard_sks.append(sk)
+
+    keys = []
+    with ProcessPoolExecutor(len(shards)) as pool:
+        for shard_keys in pool.map(
+            _derive_shard,
+            repeat(master_private),
+            shard_sks,
+            [shard[0] for shard in shards],
+            shards,
+        ):
+            keys.extend(shard_keys)
+    return keys
+
+
+def _derive_shard(
+    master_private: bytes, sk: bytes, sk_counter: int, counters: list[int]
+) -> list[tuple[int, int, bytes]]:
+    """Worker for derive_keys: `sk` is SK_sk_counter."""
+    return list(
+        _iter_keys_at(
+            bytes_to_scalar(master_private), sk, sk_counter, counters
+        )
+    )
+
+
+# ---------------------------------------------------------------------------
+# Derived key cache
+# ---------------------------------------------------------------------------
+
+
+def _open_key_cache(path: str) -> sqlite3.Connection:
+    """Open (creating if needed) the derived key cache database."""
+    p = Path(path).expanduser()
+    p.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Holds derived private keys: keep it private to the user
+    p.touch(mode=0o600, exist_ok=True)
+    db = sqlite3.connect(p)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS keys "
+            "(hash BLOB PRIMARY KEY, d BLOB NOT NULL, x BLOB NOT NULL)"
+        )
+    except sqlite3.Error:
+        db.close()
+        raise
+    return db
+
+
+def _key_cache_id(master_private: bytes, sk0: bytes, counter: int) -> bytes:
+    """Cache key for one derived key: SHA-256(priv || SK_0 || counter_be32)."""
+    return hashlib.sha256(
+        master_private + sk0 + counter.to_bytes(4, "big")
+    ).digest()
+
+
+def _load_cached_keys(
+    db: sqlite3.Connection, master_private: bytes, sk0: bytes, counters
+) -> dict[int, tuple[int, bytes]]:
+    """Look up cached keys for `counters`; returns {counter: (d_i, x_i)}."""
+    ids = {_key_cache_id(master_private, sk0, i): i for i in counters}
+    id_list = list(ids)
+    found = {}
+    # Stay under SQLite's bound parameter limit
+    for start in range(0, len(id_list), 500):
+        batch = id_list[start : start + 500]
+        rows = db.execute(
+            "SELECT hash, d, x FROM keys WHERE hash IN "
+            f"({','.join('?' * len(batch))})",
+            batch,
+        )
+        for key_id, d, x in rows:
+            found[ids[key_id]] = (int.from_bytes(d, "big"), x)
+    return found
+
+
+def _store_cached_keys(
+    db: sqlite3.Connection,
+    master_private: bytes,
+    sk0: bytes,
+    keys: list[tuple[int, int, bytes]],
+) -> None:
+    """Insert derived keys into the cache in a single transaction."""
+    with db:
+        db.executemany(
+            "INSERT OR REPLACE INTO keys (hash, d, x) VALUES (?, ?, ?)",
+            [
+                (
+                    _key_cache_id(master_private, sk0, i),
+                    d_i.to_bytes(28, "big"),
+                    x_i,
+                )
+                for i, d_i, x_i in keys
+            ],
+        )
 
 
 def hashed_adv_key(public_key_x: bytes) -> str:
@@ -143,7 +389,9 @@ def hashed_adv_key(public_key_x: bytes) -> str:
 
     This is the identifier Apple uses to index location reports.
     """
-    return base64.b64encode(hashlib.sha256(public_key_x).digest()).decode()
+    return binascii.b2a_base64(
+        hashlib.sha256(public_key_x).digest(), newline=False
+    ).decode("ascii")
 
 
 def ble_address_from_key(public_key_x: bytes) -> str:
@@ -183,8 +431,14 @@ def fetch_reports(
     key_hashes: list[str],
     hours: int,
     anisette_url: str,
+    session=None,
+    headers: dict | None = None,
 ) -> list[dict]:
-    """Fetch location reports from Apple's acsnservice/fetch endpoint."""
+    """Fetch location reports from Apple's acsnservice/fetch endpoint.
+
+    `session` (a requests.Session) and pre-fetched anisette `headers` may be
+    passed in to share them across several calls.
+    """
     import requests
 
     now = int(time.time())
@@ -200,9 +454,10 @@ def fetch_reports(
         ]
     }
 
-    headers = fetch_anisette_headers(anisette_url)
+    if headers is None:
+        headers = fetch_anisette_headers(anisette_url)
 
-    r = requests.post(
+    r = (session or requests).post(
         "https://gateway.icloud.com/acsnservice/fetch",
         auth=(dsid, token),
         headers=headers,
@@ -216,7 +471,7 @@ def fetch_reports(
         print(r.text[:500], file=sys.stderr)
         return []
 
-    return json.loads(r.content.decode()).get("results", [])
+    return r.json().get("results", [])
 
 
 def fetch_reports_batched(
@@ -228,16 +483,52 @@ def fetch_reports_batched(
 ) -> list[dict]:
     """Fetch reports in batches to avoid Apple's per-request result limit."""
     reports = []
-    for i in range(0, len(key_hashes), FETCH_BATCH_SIZE):
-        batch = key_hashes[i : i + FETCH_BATCH_SIZE]
-        reports.extend(
-            fetch_reports(dsid, token, batch, hours, anisette_url)
-        )
-        if i + FETCH_BATCH_SIZE < len(key_hashes):
-            time.sleep(1)
+    for batch_reports in iter_report_batches(
+        dsid, token, key_hashes, hours, anisette_url
+    ):
+        reports.extend(batch_reports)
     return reports
 
 
+def iter_report_batches(
+    dsid: str,
+    token: str,
+    key_hashes: list[str],
+    hours: int,
+    anisette_url: str,
+) -> Iterator[list[dict]]:
+    """Fetch reports in batches, yielding each batch's reports in order.
+
+    Batches are sent one at a time over one keep-alive session, with the
+    anisette headers fetched once for all of them. Requests start at least
+    FETCH_INTERVAL_SECS apart; time the caller spends on a yielded batch
+    counts towards that gap.
+    """
+    import requests
+
+    if not key_hashes:
+        return
+
+    headers = fetch_anisette_headers(anisette_url)
+    with requests.Session() as session:
+        sent_at = None
+        for i in range(0, len(key_hashes), FETCH_BATCH_SIZE):
+            if sent_at is not None:
+                wait = sent_at + FETCH_INTERVAL_SECS - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            sent_at = time.monotonic()
+            yield fetch_reports(
+                dsid,
+                token,
+                key_hashes[i : i + FETCH_BATCH_SIZE],
+                hours,
+                anisette_url,
+                session=session,
+                headers=headers,
+            )
+
+
 def decrypt_report(
     report_payload_b64: str, private_key_int: int
 ) -> dict | None:
@@ -257,14 +548,14 @@ def decrypt_report(
     eph_key_bytes = data[5:62]
     try:
         eph_key = ec.EllipticCurvePublicKey.from_encoded_point(
-            ec.SECP224R1(), eph_key_bytes
+            _CURVE, eph_key_bytes
         )
     except Exception:
         return None
 
     # ECDH shared secret
     priv_key = ec.derive_private_key(
-        private_key_int, ec.SECP224R1(), default_backend()
+        private_key_int, _CURVE, _BACKEND
     )
     shared_key = priv_key.exchange(ec.ECDH(), eph_key)
 
@@ -314,7 +605,7 @@ def generate_keys() -> dict:
     """Generate fresh key material for provisioning."""
     import secrets
 
-    priv_key = ec.generate_private_key(ec.SECP224R1(), default_backend())
+    priv_key = ec.generate_private_key(_CURVE, _BACKEND)
     d = priv_key.private_numbers().private_value
     private_key_bytes = d.to_bytes(28, "big")
 
@@ -369,6 +660,18 @@ def _add_key_args(parser):
         help="Initial symmetric key SK_0 (64 hex chars, 32 bytes)",
     )
     parser.add_argument("--epoch", type=int, help="Epoch unix timestamp")
+    parser.add_argument(
+        "--key-cache",
+        default=DEFAULT_KEY_CACHE,
+        help=f"Derived key cache (default: {DEFAULT_KEY_CACHE})",
+    )
+    parser.add_argument(
+        "--no-key-cache",
+        dest="key_cache",
+        action="store_const",
+        const=None,
+        help="Derive every key without reading or writing the cache",
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -422,8 +725,9 @@ def cmd_keys(args):
     print(f"Keys to derive: {counter_end - counter_start + 1}")
     print()
 
-    for i in range(counter_start, counter_end + 1):
-        d_i, x_i = derive_key_at(priv, sk0, i)
+    for i, d_i, x_i in derive_keys(
+        priv, sk0, counter_start, counter_end, cache_path=args.key_cache
+    ):
         ts = (epoch // KEY_ROTATION_SECS + i) * KEY_ROTATION_SECS
         dt = datetime.datetime.fromtimestamp(
             ts, tz=datetime.timezone.utc
@@ -466,8 +770,9 @@ def cmd_fetch(args):
 
     # Derive all keys for the time range
     key_map: dict[str, tuple[int, int, bytes]] = {}
-    for i in range(counter_start, counter_end + 1):
-        d_i, x_i = derive_key_at(priv, sk0, i)
+    for i, d_i, x_i in derive_keys(
+        priv, sk0, counter_start, counter_end, cache_path=args.key_cache
+    ):
         h = hashed_adv_key(x_i)
         key_map[h] = (i, d_i, x_i)
 
@@ -479,25 +784,26 @@ def cmd_fetch(args):
         f"Querying Apple with {len(all_hashes)} key hashes in {n_batches} batches..."
     )
 
-    reports = fetch_reports_batched(
-        dsid, token, all_hashes, args.hours, args.anisette_url
-    )
-    print(f"Received {len(reports)} raw reports.")
-
-    # Decrypt reports
+    # Decrypt each batch as it arrives, keeping only the decoded locations
     results = []
-    for report in reports:
-        key_hash = report["id"]
-        if key_hash not in key_map:
-            continue
-        counter, d_i, x_i = key_map[key_hash]
-        loc = decrypt_report(report["payload"], d_i)
-        if loc:
-            loc["counter"] = counter
-            loc["maps_url"] = (
-                f"https://maps.google.com/maps?q={loc['lat']},{loc['lon']}"
-            )
-            results.append(loc)
+    n_reports = 0
+    for reports in iter_report_batches(
+        dsid, token, all_hashes, args.hours, args.anisette_url
+    ):
+        n_reports += len(reports)
+        for report in reports:
+            key_hash = report["id"]
+            if key_hash not in key_map:
+                continue
+            counter, d_i, x_i = key_map[key_hash]
+            loc = decrypt_report(report["payload"], d_i)
+            if loc:
+                loc["counter"] = counter
+                loc["maps_url"] = (
+                    f"https://maps.google.com/maps?q={loc['lat']},{loc['lon']}"
+                )
+                results.append(loc)
+    print(f"Received {n_reports} raw reports.")
 
     results.sort(key=lambda r: r["timestamp"])
 
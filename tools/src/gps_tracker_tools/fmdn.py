@@ -14,6 +14,7 @@ Subcommands:
 """
 
 import argparse
+import functools
 import hashlib
 import json
 import os
@@ -23,6 +24,12 @@ import time
 
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+try:
+    from ecdsa.curves import SECP160r1 as _ECDSA_SECP160R1
+    from ecdsa.ellipticcurve import INFINITY, PointJacobi
+except ImportError:
+    _ECDSA_SECP160R1 = None
+
 # SECP160R1 curve parameters (matching firmware secp160r1.rs)
 SECP160R1_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF7FFFFFFF
 SECP160R1_A = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF7FFFFFFC
@@ -42,20 +49,8 @@ EIK_SIZE = 32
 
 
 def modinv(a: int, m: int) -> int:
-    """Modular inverse via extended Euclidean algorithm."""
-    if a < 0:
-        a = a % m
-    g, x, _ = _extended_gcd(a, m)
-    if g != 1:
-        raise ValueError("No modular inverse")
-    return x % m
-
-
-def _extended_gcd(a: int, b: int):
-    if a == 0:
-        return b, 0, 1
-    g, x, y = _extended_gcd(b % a, a)
-    return g, y - (b // a) * x, x
+    """Modular inverse; raises ValueError if a is not invertible mod m."""
+    return pow(a, -1, m)
 
 
 def point_add(
@@ -82,17 +77,128 @@ def point_add(
 
 
 def scalar_mul(k: int, x: int, y: int) -> tuple[int, int]:
-    """Scalar multiplication on SECP160R1 using double-and-add."""
-    rx, ry = 0, 0
-    qx, qy = x, y
+    """Scalar multiplication on SECP160R1; (0, 0) is the point at infinity.
+
+    Uses the ecdsa package's Jacobian arithmetic when it is installed (with
+    a precomputed table for G), else the pure-Python double-and-add.
+    """
+    if _ECDSA_SECP160R1 is None:
+        if x == SECP160R1_GX and y == SECP160R1_GY:
+            return _scalar_mul_base_python(k)
+        return _scalar_mul_python(k, x, y)
+    if x == 0 and y == 0:
+        return 0, 0
+
+    if x == SECP160R1_GX and y == SECP160R1_GY:
+        point = _ECDSA_SECP160R1.generator
+    else:
+        point = PointJacobi(
+            _ECDSA_SECP160R1.curve, x, y, 1, SECP160R1_N
+        )
+    result = point * k
+    if result == INFINITY:
+        return 0, 0
+    return result.x(), result.y()
 
-    while k > 0:
-        if k & 1:
-            rx, ry = point_add(rx, ry, qx, qy)
-        qx, qy = point_add(qx, qy, qx, qy)
-        k >>= 1
 
-    return rx, ry
+def point_double_jac(
+    x: int, y: int, z: int
+) -> tuple[int, int, int]:
+    """Double a SECP160R1 point in Jacobian coordinates (z == 0 is infinity)."""
+    p = SECP160R1_P
+    if z == 0 or y == 0:
+        return 0, 1, 0
+    yy = y * y % p
+    s = 4 * x * yy % p
+    zz = z * z % p
+    m = (3 * x * x + SECP160R1_A * zz * zz) % p
+    x3 = (m * m - 2 * s) % p
+    y3 = (m * (s - x3) - 8 * yy * yy) % p
+    z3 = 2 * y * z % p
+    return x3, y3, z3
+
+
+def point_add_jac(
+    x1: int, y1: int, z1: int, x2: int, y2: int
+) -> tuple[int, int, int]:
+    """Add an affine point (x2, y2) to a Jacobian point on SECP160R1."""
+    p = SECP160R1_P
+    if z1 == 0:
+        return x2, y2, 1
+    z1z1 = z1 * z1 % p
+    h = (x2 * z1z1 - x1) % p
+    r = (y2 * z1 * z1z1 - y1) % p
+    if h == 0:
+        if r == 0:
+            return point_double_jac(x1, y1, z1)
+        return 0, 1, 0  # Point at infinity
+
+    hh = h * h % p
+    hhh = h * hh % p
+    v = x1 * hh % p
+    x3 = (r * r - hhh - 2 * v) % p
+    y3 = (r * (v - x3) - y1 * hhh) % p
+    z3 = z1 * h % p
+    return x3, y3, z3
+
+
+def _scalar_mul_python(k: int, x: int, y: int) -> tuple[int, int]:
+    """Scalar multiplication on SECP160R1 using double-and-add.
+
+    Works in Jacobian coordinates so only the final conversion back to
+    affine needs a modular inverse.
+    """
+    if k <= 0 or (x == 0 and y == 0):
+        return 0, 0
+
+    rx, ry, rz = 0, 1, 0
+    for bit in bin(k)[2:]:
+        rx, ry, rz = point_double_jac(rx, ry, rz)
+        if bit == "1":
+            rx, ry, rz = point_add_jac(rx, ry, rz, x, y)
+
+    return _jac_to_affine(rx, ry, rz)
+
+
+@functools.cache
+def _base_point_table() -> list[list[tuple[int, int]]]:
+    """Affine multiples d * 256**i * G for every byte digit d and position i."""
+    table = []
+    bx, by = SECP160R1_GX, SECP160R1_GY
+    for _ in range((SECP160R1_N.bit_length() + 7) // 8):
+        row = [(0, 0)]
+        px, py = bx, by
+        for _ in range(255):
+            row.append((px, py))
+            px, py = point_add(px, py, bx, by)
+        table.append(row)
+        bx, by = px, py  # 256 * previous base
+    return table
+
+
+def _scalar_mul_base_python(k: int) -> tuple[int, int]:
+    """Multiply G by k using the precomputed per-byte table (no doublings)."""
+    table = _base_point_table()
+    k %= SECP160R1_N
+    rx, ry, rz = 0, 1, 0
+    for row in table:
+        if not k:
+            break
+        digit = k & 0xFF
+        if digit:
+            rx, ry, rz = point_add_jac(rx, ry, rz, *row[digit])
+        k >>= 8
+    return _jac_to_affine(rx, ry, rz)
+
+
+def _jac_to_affine(x: int, y: int, z: int) -> tuple[int, int]:
+    """Convert a Jacobian SECP160R1 point to affine ((0, 0) for infinity)."""
+    if z == 0:
+        return 0, 0
+    p = SECP160R1_P
+    z_inv = modinv(z, p)
+    z_inv2 = z_inv * z_inv % p
+    return x * z_inv2 % p, y * z_inv2 * z_inv % p
 
 
 # ---------------------------------------------------------------------------
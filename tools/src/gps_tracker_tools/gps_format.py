@@ -10,12 +10,222 @@ Block types:
 """
 
 import argparse
+import contextlib
+import functools
+import itertools
 import json
+import mmap
+import re
 import struct
-from datetime import datetime
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson
+except ImportError:  # optional: much faster JSON output for decode
+    orjson = None
+
+# Full block: 0xFF header, u32 timestamp, i32 lat, i32 lon, i32 alt
+_FULL_BLOCK = struct.Struct("<BIiii")
+FULL_BLOCK_SIZE = _FULL_BLOCK.size
+_FULL_PAYLOAD = struct.Struct("<Iiii")
+# ZigZag decoding of every single-byte varint, looked up instead of computed
+_ZIGZAG_BYTE = tuple((b >> 1) ^ -(b & 1) for b in range(0x80))
+# Two-digit seconds for ISO timestamps
+_SECONDS = tuple(f"{second:02d}" for second in range(60))
+# Any single block: a full block, or a delta header with one varint of up
+# to 5 bytes per flagged field
+_BLOCK_RE = re.compile(
+    b"|".join(
+        [rb"\xff[\x00-\xff]{16}"]
+        + [
+            re.escape(bytes((header,)))
+            + rb"[\x80-\xff]{0,4}[\x00-\x7f]" * header.bit_count()
+            for header in range(0x10)
+        ]
+    )
+)
+# Files smaller than this are decoded in-process; starting a pool costs more
+PARALLEL_DECODE_MIN_SIZE = 1 << 20
+# Valid coordinate ranges at the 1e-5 degree storage scale
+MAX_LATITUDE_SCALED = 90 * 10**5
+MAX_LONGITUDE_SCALED = 180 * 10**5
+# Largest possible block: delta header followed by four 5-byte varints
+MAX_BLOCK_SIZE = 1 + 4 * 5
+
+
+def _is_all_full(data: bytes) -> bool:
+    """Whether data is nothing but back to back full blocks."""
+    count, remainder = divmod(len(data), FULL_BLOCK_SIZE)
+    return (
+        count > 0
+        and not remainder
+        and data[::FULL_BLOCK_SIZE].count(0xFF) == count
+    )
+
+
+def _decode_delta_payload(
+    data: bytes, offset: int, flags: int
+) -> tuple[list[int], int]:
+    """Read the ZigZag varints selected by a delta header's flags.
+
+    Returns the (timestamp, lat, lon, alt) deltas, zero where the flag is
+    clear, and the offset just past the payload. One- and two-byte varints,
+    which cover almost every delta in a real track, are decoded without
+    entering the per-byte loop.
+    """
+    deltas = [0, 0, 0, 0]
+    end = len(data)
+    for field in range(4):
+        if not (flags >> (3 - field)) & 1:
+            continue
+        if offset >= end:
+            raise ValueError("Buffer underflow while reading varint")
+        byte = data[offset]
+        if byte < 0x80:
+            offset += 1
+            deltas[field] = _ZIGZAG_BYTE[byte]
+            continue
+        if offset + 1 < end and data[offset + 1] < 0x80:
+            unsigned_val = (byte & 0x7F) | (data[offset + 1] << 7)
+            offset += 2
+            deltas[field] = (unsigned_val >> 1) ^ -(unsigned_val & 1)
+            continue
+
+        offset += 1
+        unsigned_val = byte & 0x7F
+        shift = 7
+        while True:
+            if shift > 28:
+                raise ValueError("Varint too long or malformed")
+            if offset >= end:
+                raise ValueError("Buffer underflow while reading varint")
+            byte = data[offset]
+            offset += 1
+            unsigned_val |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        deltas[field] = (unsigned_val >> 1) ^ -(unsigned_val & 1)
+    return deltas, offset
+
+
+def _write_varint_s32_into(buf: bytearray, pos: int, value: int) -> int:
+    """Write a ZigZag varint of a signed 32-bit value into buf at pos.
+
+    Returns the position just past the written bytes.
+    """
+    zz_value = (value << 1) ^ (value >> 31)
+    while zz_value >= 0x80:
+        buf[pos] = (zz_value & 0x7F) | 0x80
+        zz_value >>= 7
+        pos += 1
+    buf[pos] = zz_value
+    return pos + 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _isoformat(timestamp: int) -> str:
+    """Local-time ISO string for timestamp; stationary tracks repeat them."""
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def _format_timestamps(timestamps) -> list[str]:
+    """Local-time ISO strings for timestamps, as datetime.isoformat gives.
+
+    Tracks log many points per minute, so the "YYYY-MM-DDTHH:MM:" prefix
+    is formatted once per minute and only the seconds are appended. A
+    minute that straddles a UTC offset change is formatted point by point.
+    """
+    formatted = []
+    prefixes = {}
+    for timestamp in timestamps:
+        minute, second = divmod(timestamp, 60)
+        prefix = prefixes.get(minute)
+        if prefix is None:
+            start = datetime.fromtimestamp(minute * 60)
+            end = datetime.fromtimestamp(minute * 60 + 59)
+            if start.second == 0 and end - start == timedelta(seconds=59):
+                prefix = start.isoformat()[:-2]
+            else:
+                prefix = ""
+            prefixes[minute] = prefix
+        if prefix:
+            formatted.append(prefix + _SECONDS[second])
+        else:
+            formatted.append(_isoformat(timestamp))
+    return formatted
+
+
+def _point_dict(
+    timestamp: int,
+    timestamp_iso: str,
+    latitude_scaled_1e5: int,
+    longitude_scaled_1e5: int,
+    altitude_m_scaled_1e1: int,
+    include_scaled: bool = False,
+) -> dict:
+    point = {
+        "timestamp": timestamp,
+        "timestamp_iso": timestamp_iso,
+        "latitude": latitude_scaled_1e5 / 1e5,
+        "longitude": longitude_scaled_1e5 / 1e5,
+        "altitude": altitude_m_scaled_1e1 / 10.0,
+    }
+    if include_scaled:
+        point["latitude_scaled"] = latitude_scaled_1e5
+        point["longitude_scaled"] = longitude_scaled_1e5
+        point["altitude_scaled"] = altitude_m_scaled_1e1
+    return point
+
+
+def _write_delta_blocks(
+    buf: bytearray,
+    pos: int,
+    previous: "GpsPoint",
+    points: list["GpsPoint"],
+) -> int:
+    """Write points as delta blocks, each relative to the one before it.
+
+    Returns the position just past the last block.
+    """
+    prev_ts = previous.timestamp
+    prev_lat = previous.latitude_scaled_1e5
+    prev_lon = previous.longitude_scaled_1e5
+    prev_alt = previous.altitude_m_scaled_1e1
+    for point in points:
+        ts = point.timestamp
+        lat = point.latitude_scaled_1e5
+        lon = point.longitude_scaled_1e5
+        alt = point.altitude_m_scaled_1e1
+
+        d_ts = ts - prev_ts
+        d_lat = lat - prev_lat
+        d_lon = lon - prev_lon
+        d_alt = alt - prev_alt
+        buf[pos] = (
+            (d_ts != 0) << 3
+            | (d_lat != 0) << 2
+            | (d_lon != 0) << 1
+            | (d_alt != 0)
+        )
+        pos += 1
+        if d_ts:
+            pos = _write_varint_s32_into(buf, pos, d_ts)
+        if d_lat:
+            pos = _write_varint_s32_into(buf, pos, d_lat)
+        if d_lon:
+            pos = _write_varint_s32_into(buf, pos, d_lon)
+        if d_alt:
+            pos = _write_varint_s32_into(buf, pos, d_alt)
+
+        prev_ts, prev_lat, prev_lon, prev_alt = ts, lat, lon, alt
+    return pos
+
 
 class GpsPoint:
     """GPS point with scaled values."""
@@ -32,19 +242,15 @@ class GpsPoint:
         self.longitude_scaled_1e5 = longitude_scaled_1e5
         self.altitude_m_scaled_1e1 = altitude_m_scaled_1e1
 
-    def to_dict(self) -> dict:
-        return {
-            "timestamp": self.timestamp,
-            "timestamp_iso": datetime.fromtimestamp(
-                self.timestamp
-            ).isoformat(),
-            "latitude": self.latitude_scaled_1e5 / 1e5,
-            "longitude": self.longitude_scaled_1e5 / 1e5,
-            "altitude": self.altitude_m_scaled_1e1 / 10.0,
-            "latitude_scaled": self.latitude_scaled_1e5,
-            "longitude_scaled": self.longitude_scaled_1e5,
-            "altitude_scaled": self.altitude_m_scaled_1e1,
-        }
+    def to_dict(self, include_scaled: bool = False) -> dict:
+        return _point_dict(
+            self.timestamp,
+            _isoformat(self.timestamp),
+            self.latitude_scaled_1e5,
+            self.longitude_scaled_1e5,
+            self.altitude_m_scaled_1e1,
+            include_scaled,
+        )
 
     @classmethod
     def from_dict(cls, data: dict) -> "GpsPoint":
@@ -55,48 +261,155 @@ class GpsPoint:
                 data["longitude_scaled"],
                 data["altitude_scaled"],
             )
+        # Round rather than truncate so scaled values written as floats
+        # (31.08831 * 1e5 == 3108830.9999999995) come back exactly
         return cls(
             int(data["timestamp"]),
-            int(data["latitude"] * 1e5),
-            int(data["longitude"] * 1e5),
-            int(data["altitude"] * 10),
+            round(data["latitude"] * 1e5),
+            round(data["longitude"] * 1e5),
+            round(data["altitude"] * 10),
         )
 
 
-class GpsFormatDecoder:
-    """Decoder for the custom GPS binary format."""
+class GpsTrack:
+    """Decoded track stored column-wise, one array per field."""
 
     def __init__(self):
-        self.previous_point: Optional[GpsPoint] = None
-        self.is_first_point = True
+        self.timestamps = array("I")
+        self.latitudes = array("i")
+        self.longitudes = array("i")
+        self.altitudes = array("i")
+        self.block_types: list[str] = []
 
-    def _read_varint_s32(
-        self, data: bytes, offset: int
-    ) -> tuple[int, int]:
-        unsigned_val = 0
-        shift = 0
-        i = 0
+    def __len__(self) -> int:
+        return len(self.timestamps)
 
-        while i < 5:
-            if offset + i >= len(data):
-                raise ValueError(
-                    "Buffer underflow while reading varint"
-                )
-            byte = data[offset + i]
-            unsigned_val |= (byte & 0x7F) << shift
-            shift += 7
-            i += 1
-            if (byte & 0x80) == 0:
-                result = (unsigned_val >> 1) ^ -(unsigned_val & 1)
-                return result, i
+    def append(
+        self,
+        block_type: str,
+        timestamp: int,
+        latitude_scaled_1e5: int,
+        longitude_scaled_1e5: int,
+        altitude_m_scaled_1e1: int,
+    ) -> None:
+        self.timestamps.append(timestamp)
+        self.latitudes.append(latitude_scaled_1e5)
+        self.longitudes.append(longitude_scaled_1e5)
+        self.altitudes.append(altitude_m_scaled_1e1)
+        self.block_types.append(block_type)
+
+    def extend(self, other: "GpsTrack") -> None:
+        """Append every point of other, keeping its block types."""
+        self.timestamps.extend(other.timestamps)
+        self.latitudes.extend(other.latitudes)
+        self.longitudes.extend(other.longitudes)
+        self.altitudes.extend(other.altitudes)
+        self.block_types.extend(other.block_types)
+
+    def extend_deltas(
+        self,
+        start: tuple[int, int, int, int],
+        deltas: tuple[list[int], ...],
+    ) -> None:
+        """Append the points reached by applying per-field deltas to start.
+
+        deltas holds one list per field, (timestamp, lat, lon, alt), with a
+        zero wherever a block leaves that field unchanged.
+
+        Raises ValueError if a lat, lon or alt value leaves the int32 range;
+        the points before it are kept, so every column stays the same length.
+        """
+        columns = (
+            self.timestamps,
+            self.latitudes,
+            self.longitudes,
+            self.altitudes,
+        )
+        field_values = []
+        for field, (value, field_deltas) in enumerate(zip(start, deltas)):
+            values = list(
+                itertools.accumulate(field_deltas, initial=value)
+            )
+            del values[0]
+            if field == 0 and (min(values) < 0 or max(values) > 0xFFFFFFFF):
+                # Timestamps wrap like the u32 they are stored as
+                values = [ts & 0xFFFFFFFF for ts in values]
+            field_values.append(values)
+
+        length = len(self)
+        try:
+            for column, values in zip(columns, field_values):
+                column.extend(values)
+        except OverflowError:
+            for column in columns:
+                del column[length:]
+            count = next(
+                index
+                for index, point in enumerate(zip(*field_values[1:]))
+                if not all(-0x80000000 <= v <= 0x7FFFFFFF for v in point)
+            )
+            for column, values in zip(columns, field_values):
+                column.extend(values[:count])
+            self.block_types.extend(["delta"] * count)
+            raise ValueError(
+                "Delta block moves a coordinate outside the int32 range"
+            ) from None
+        self.block_types.extend(["delta"] * len(deltas[0]))
+
+    def compact(self) -> None:
+        """Narrow the altitude column to int16 when every value fits.
+
+        Only the in-memory track changes; the file format stays int32.
+        Appending an altitude outside the int16 range afterwards raises
+        OverflowError.
+        """
+        altitudes = self.altitudes
+        if (
+            altitudes.typecode != "h"
+            and altitudes
+            and min(altitudes) >= -0x8000
+            and max(altitudes) <= 0x7FFF
+        ):
+            self.altitudes = array("h", altitudes)
+
+    def point(self, index: int) -> GpsPoint:
+        return GpsPoint(
+            self.timestamps[index],
+            self.latitudes[index],
+            self.longitudes[index],
+            self.altitudes[index],
+        )
 
-        raise ValueError("Varint too long or malformed")
+    def to_points(
+        self, first_index: int = 0, include_scaled: bool = False
+    ) -> list[dict]:
+        """Build the per-block dicts used by the JSON output."""
+        return [
+            {
+                "index": index,
+                "type": block_type,
+                "data": _point_dict(
+                    ts, ts_iso, lat, lon, alt, include_scaled
+                ),
+            }
+            for index, block_type, ts, ts_iso, lat, lon, alt in zip(
+                itertools.count(first_index),
+                self.block_types,
+                self.timestamps,
+                _format_timestamps(self.timestamps),
+                self.latitudes,
+                self.longitudes,
+                self.altitudes,
+            )
+        ]
 
-    def _read_uint32_le(self, data: bytes, offset: int) -> int:
-        return struct.unpack("<I", data[offset : offset + 4])[0]
 
-    def _read_int32_le(self, data: bytes, offset: int) -> int:
-        return struct.unpack("<i", data[offset : offset + 4])[0]
+class GpsFormatDecoder:
+    """Decoder for the custom GPS binary format."""
+
+    def __init__(self):
+        self.previous_point: Optional[GpsPoint] = None
+        self.is_first_point = True
 
     def decode_block(
         self, data: bytes, offset: int
@@ -112,10 +425,9 @@ class GpsFormatDecoder:
                 raise ValueError(
                     "Buffer underflow for Full Block payload"
                 )
-            timestamp = self._read_uint32_le(data, offset)
-            latitude = self._read_int32_le(data, offset + 4)
-            longitude = self._read_int32_le(data, offset + 8)
-            altitude = self._read_int32_le(data, offset + 12)
+            timestamp, latitude, longitude, altitude = (
+                _FULL_PAYLOAD.unpack_from(data, offset)
+            )
 
             point = GpsPoint(timestamp, latitude, longitude, altitude)
             self.previous_point = point
@@ -132,50 +444,17 @@ class GpsFormatDecoder:
                     f"Invalid Delta Block header: 0x{header:02X}"
                 )
 
+            previous = self.previous_point
+            (d_ts, d_lat, d_lon, d_alt), payload_end = _decode_delta_payload(
+                data, offset, header & 0x0F
+            )
             current_point = GpsPoint(
-                self.previous_point.timestamp,
-                self.previous_point.latitude_scaled_1e5,
-                self.previous_point.longitude_scaled_1e5,
-                self.previous_point.altitude_m_scaled_1e1,
+                (previous.timestamp + d_ts) & 0xFFFFFFFF,
+                previous.latitude_scaled_1e5 + d_lat,
+                previous.longitude_scaled_1e5 + d_lon,
+                previous.altitude_m_scaled_1e1 + d_alt,
             )
-
-            flags = header & 0x0F
-            payload_offset = offset
-            bytes_consumed = 1
-
-            if (flags >> 3) & 1:
-                delta, consumed = self._read_varint_s32(
-                    data, payload_offset
-                )
-                current_point.timestamp = (
-                    current_point.timestamp + delta
-                ) & 0xFFFFFFFF
-                payload_offset += consumed
-                bytes_consumed += consumed
-
-            if (flags >> 2) & 1:
-                delta, consumed = self._read_varint_s32(
-                    data, payload_offset
-                )
-                current_point.latitude_scaled_1e5 += delta
-                payload_offset += consumed
-                bytes_consumed += consumed
-
-            if (flags >> 1) & 1:
-                delta, consumed = self._read_varint_s32(
-                    data, payload_offset
-                )
-                current_point.longitude_scaled_1e5 += delta
-                payload_offset += consumed
-                bytes_consumed += consumed
-
-            if flags & 1:
-                delta, consumed = self._read_varint_s32(
-                    data, payload_offset
-                )
-                current_point.altitude_m_scaled_1e1 += delta
-                payload_offset += consumed
-                bytes_consumed += consumed
+            bytes_consumed = payload_end - offset + 1
 
             self.previous_point = current_point
             return current_point, bytes_consumed, "delta"
@@ -185,32 +464,253 @@ class GpsFormatDecoder:
                 f"Invalid block header: 0x{header:02X}"
             )
 
-    def decode_file(self, data: bytes) -> list[dict]:
-        points = []
-        offset = 0
-        block_index = 0
+    def _extend_full(self, track: GpsTrack, data: bytes) -> None:
+        """Append a run of back to back full blocks to track."""
+        if len(data) % FULL_BLOCK_SIZE:
+            raise ValueError(
+                "Full block stream is not a whole number of blocks"
+            )
+        if not data:
+            return
+
+        count = len(data) // FULL_BLOCK_SIZE
+        headers = data[::FULL_BLOCK_SIZE]
+        if headers.count(0xFF) != count:
+            header = next(h for h in headers if h != 0xFF)
+            raise ValueError(f"Invalid Full Block header: 0x{header:02X}")
+
+        columns = (
+            track.timestamps,
+            track.latitudes,
+            track.longitudes,
+            track.altitudes,
+        )
+        for column, typecode, field_offset in zip(
+            columns, "Iiii", (1, 5, 9, 13)
+        ):
+            # Byte k of a field sits at the same position in every block,
+            # so the field's column is gathered with four strided copies
+            raw = bytearray(4 * count)
+            for byte in range(4):
+                raw[byte::4] = data[field_offset + byte :: FULL_BLOCK_SIZE]
+            values = array(typecode)
+            values.frombytes(raw)
+            if sys.byteorder == "big":
+                values.byteswap()
+            column.extend(values)
+        track.block_types.extend(["full"] * count)
+        self.previous_point = track.point(-1)
+        self.is_first_point = False
+
+    def _count_full_blocks(self, data: bytes, offset: int) -> int:
+        """Number of complete full blocks starting back to back at offset."""
+        end = offset
+        last = len(data) - FULL_BLOCK_SIZE
+        while end <= last and data[end] == 0xFF:
+            end += FULL_BLOCK_SIZE
+        return (end - offset) // FULL_BLOCK_SIZE
+
+    def _flush_deltas(
+        self,
+        track: GpsTrack,
+        pending: tuple[list[int], ...],
+        data: bytes,
+        run_start: int,
+    ) -> Optional[tuple[int, str]]:
+        """Apply the pending per-field deltas to track and clear them.
+
+        The pending deltas were decoded from the run of delta blocks at
+        run_start in data. Returns the offset and reason of the first block
+        that could not be applied, with track holding every block before
+        it, or None.
+        """
+        if not pending[0]:
+            return None
+        if len(track):
+            start = (
+                track.timestamps[-1],
+                track.latitudes[-1],
+                track.longitudes[-1],
+                track.altitudes[-1],
+            )
+        else:
+            previous = self.previous_point
+            start = (
+                previous.timestamp,
+                previous.latitude_scaled_1e5,
+                previous.longitude_scaled_1e5,
+                previous.altitude_m_scaled_1e1,
+            )
+        length = len(track)
+        try:
+            track.extend_deltas(start, pending)
+        except ValueError as e:
+            # Step over the blocks that were applied to find the bad one
+            offset = run_start
+            for _ in range(len(track) - length):
+                _, offset = _decode_delta_payload(
+                    data, offset + 1, data[offset]
+                )
+            return offset, str(e)
+        finally:
+            for deltas in pending:
+                deltas.clear()
+        return None
+
+    def decode_track(self, data: bytes, workers: int = 1) -> GpsTrack:
+        """Decode a binary file into a column-wise GpsTrack.
+
+        Runs of full blocks are unpacked in one go. Delta blocks only have
+        their varints decoded in the loop; each run of them is then applied
+        column by column with a running sum, so no GpsPoint is built per
+        block. With workers > 1, large files are split at full blocks and
+        decoded by up to that many processes.
+        """
+        track = GpsTrack()
+        if _is_all_full(data):
+            # Files written with a full block interval of 1 need no block
+            # walk at all
+            self._extend_full(track, data)
+            track.compact()
+            return track
+
+        if (
+            workers > 1
+            and self.is_first_point
+            and len(data) >= PARALLEL_DECODE_MIN_SIZE
+        ):
+            error = self._decode_parallel(track, data, workers)
+        else:
+            error = self._decode_into(track, data)
+        if error:
+            offset, message = error
+            print(
+                f"Error decoding block {len(track)} at offset {offset}: {message}"
+            )
 
-        while offset < len(data):
+        if len(track):
+            self.previous_point = track.point(-1)
+            self.is_first_point = False
+        track.compact()
+        return track
+
+    def _decode_parallel(
+        self, track: GpsTrack, data: bytes, workers: int
+    ) -> Optional[tuple[int, str]]:
+        """Decode data in chunks that each start with a full block.
+
+        Returns the offset and reason of the first malformed block, with
+        track holding every block before it, or None.
+        """
+        starts = _split_at_full_blocks(data, workers)
+        bounds = list(zip(starts, starts[1:] + [len(data)]))
+        with ProcessPoolExecutor(len(bounds)) as pool:
+            results = pool.map(
+                _decode_chunk, (data[start:end] for start, end in bounds)
+            )
+            for (start, _), (chunk, error) in zip(bounds, results):
+                track.extend(chunk)
+                if error:
+                    pool.shutdown(cancel_futures=True)
+                    offset, message = error
+                    return start + offset, message
+        return None
+
+    def _decode_into(
+        self, track: GpsTrack, data: bytes
+    ) -> Optional[tuple[int, str]]:
+        """Decode data block by block, appending to track.
+
+        Returns the offset and reason of the first malformed block, with
+        track holding every block before it, or None.
+        """
+        pending = ([], [], [], [])
+        pending_ts, pending_lat, pending_lon, pending_alt = pending
+
+        offset = 0
+        run_start = 0
+        end = len(data)
+        error = None
+        while offset < end:
             try:
-                point, consumed, block_type = self.decode_block(
-                    data, offset
-                )
-                points.append(
-                    {
-                        "index": block_index,
-                        "type": block_type,
-                        "data": point.to_dict(),
-                    }
-                )
-                offset += consumed
-                block_index += 1
+                header = data[offset]
+                if header & 0xF0 == 0 and not self.is_first_point:
+                    if not pending_ts:
+                        run_start = offset
+                    (d_ts, d_lat, d_lon, d_alt), offset = (
+                        _decode_delta_payload(data, offset + 1, header)
+                    )
+                    pending_ts.append(d_ts)
+                    pending_lat.append(d_lat)
+                    pending_lon.append(d_lon)
+                    pending_alt.append(d_alt)
+                    continue
+
+                error = self._flush_deltas(track, pending, data, run_start)
+                if error:
+                    break
+                run = self._count_full_blocks(data, offset)
+                if run:
+                    run_end = offset + run * FULL_BLOCK_SIZE
+                    self._extend_full(track, data[offset:run_end])
+                    offset = run_end
+                else:
+                    # A truncated full block or a bad header; decode_block
+                    # reports the specific error
+                    point, consumed, block_type = self.decode_block(
+                        data, offset
+                    )
+                    offset += consumed
+                    track.append(
+                        block_type,
+                        point.timestamp,
+                        point.latitude_scaled_1e5,
+                        point.longitude_scaled_1e5,
+                        point.altitude_m_scaled_1e1,
+                    )
             except Exception as e:
-                print(
-                    f"Error decoding block {block_index} at offset {offset}: {e}"
-                )
+                error = (offset, str(e))
                 break
 
-        return points
+        # Deltas decoded before a malformed block are still applied
+        flush_error = self._flush_deltas(track, pending, data, run_start)
+        return flush_error or error
+
+    def decode_file(
+        self, data: bytes, include_scaled: bool = False, workers: int = 1
+    ) -> list[dict]:
+        return self.decode_track(data, workers).to_points(
+            include_scaled=include_scaled
+        )
+
+
+def _split_at_full_blocks(data: bytes, parts: int) -> list[int]:
+    """Offsets of full blocks that cut data into about `parts` chunks.
+
+    Block boundaries come from matching the block grammar with a regex,
+    which walks the file in C. The walk stops at the first byte that does
+    not start a well-formed block; nothing after it is used as a split.
+    """
+    chunk_size = len(data) // parts
+    starts = [0]
+    position = 0
+    for match in _BLOCK_RE.finditer(data):
+        start = match.start()
+        if start != position:
+            break
+        position = match.end()
+        if data[start] == 0xFF and start - starts[-1] >= chunk_size:
+            starts.append(start)
+    return starts
+
+
+def _decode_chunk(
+    data: bytes,
+) -> tuple[GpsTrack, Optional[tuple[int, str]]]:
+    """Worker for parallel decoding of a chunk that starts with a full block."""
+    track = GpsTrack()
+    error = GpsFormatDecoder()._decode_into(track, data)
+    return track, error
 
 
 class GpsFormatEncoder:
@@ -223,151 +723,142 @@ class GpsFormatEncoder:
         self.points_since_last_full = 0
         self.output_buffer = bytearray()
 
-    def _write_varint_s32(self, value: int) -> bytes:
-        zz_value = (value << 1) ^ (value >> 31)
-        result = bytearray()
-        while zz_value >= 0x80:
-            result.append(zz_value | 0x80)
-            zz_value >>= 7
-        result.append(zz_value)
-        return result
-
-    def _write_uint32_le(self, value: int) -> bytes:
-        return struct.pack("<I", value)
-
-    def _write_int32_le(self, value: int) -> bytes:
-        return struct.pack("<i", value)
-
     def encode_point(self, point: GpsPoint) -> bytes:
-        block_data = bytearray()
-
-        use_full_block = False
+        buf = bytearray(MAX_BLOCK_SIZE)
+        end = self._encode_into([point], buf, 0)
+        return buf[:end]
+
+    def _encode_into(
+        self, points: list[GpsPoint], buf: bytearray, pos: int
+    ) -> int:
+        """Encode points into buf at pos and return the new position.
+
+        Full and delta blocks are laid out by index up front, so the
+        block loop carries no full-block counter.
+        """
+        if not points:
+            return pos
+
+        pack_full = _FULL_BLOCK.pack_into
         if self.is_first_point:
-            use_full_block = True
-        elif self.full_block_interval == 1:
-            use_full_block = True
-        elif (
-            self.points_since_last_full
-            >= self.full_block_interval - 1
-        ):
-            use_full_block = True
-
-        if use_full_block:
-            block_data.append(0xFF)
-            block_data.extend(
-                self._write_uint32_le(point.timestamp)
-            )
-            block_data.extend(
-                self._write_int32_le(point.latitude_scaled_1e5)
-            )
-            block_data.extend(
-                self._write_int32_le(point.longitude_scaled_1e5)
-            )
-            block_data.extend(
-                self._write_int32_le(point.altitude_m_scaled_1e1)
+            first = points[0]
+            pack_full(
+                buf,
+                pos,
+                0xFF,
+                first.timestamp,
+                first.latitude_scaled_1e5,
+                first.longitude_scaled_1e5,
+                first.altitude_m_scaled_1e1,
             )
+            pos += FULL_BLOCK_SIZE
             self.points_since_last_full = 0
             self.is_first_point = False
-        else:
-            delta_timestamp = (
-                point.timestamp - self.previous_point.timestamp
-            )
-            delta_latitude = (
-                point.latitude_scaled_1e5
-                - self.previous_point.latitude_scaled_1e5
-            )
-            delta_longitude = (
-                point.longitude_scaled_1e5
-                - self.previous_point.longitude_scaled_1e5
-            )
-            delta_altitude = (
-                point.altitude_m_scaled_1e1
-                - self.previous_point.altitude_m_scaled_1e1
+            self.previous_point = first
+            points = points[1:]
+
+        # Full blocks fall on fixed indices: the next one is due once the
+        # current segment reaches full_block_interval blocks, and then every
+        # interval after that. Everything between them is a delta block.
+        interval = self.full_block_interval
+        count = len(points)
+        first_full = max(0, interval - 1 - self.points_since_last_full)
+        full_indices = range(first_full, count, interval)
+
+        pos = _write_delta_blocks(
+            buf, pos, self.previous_point, points[:first_full]
+        )
+        for start in full_indices:
+            point = points[start]
+            pack_full(
+                buf,
+                pos,
+                0xFF,
+                point.timestamp,
+                point.latitude_scaled_1e5,
+                point.longitude_scaled_1e5,
+                point.altitude_m_scaled_1e1,
             )
-
-            header = 0x00
-            if delta_timestamp != 0:
-                header |= 1 << 3
-            if delta_latitude != 0:
-                header |= 1 << 2
-            if delta_longitude != 0:
-                header |= 1 << 1
-            if delta_altitude != 0:
-                header |= 1 << 0
-
-            block_data.append(header)
-
-            if delta_timestamp != 0:
-                block_data.extend(
-                    self._write_varint_s32(delta_timestamp)
-                )
-            if delta_latitude != 0:
-                block_data.extend(
-                    self._write_varint_s32(delta_latitude)
+            pos += FULL_BLOCK_SIZE
+            if interval > 1:
+                pos = _write_delta_blocks(
+                    buf, pos, point, points[start + 1 : start + interval]
                 )
-            if delta_longitude != 0:
-                block_data.extend(
-                    self._write_varint_s32(delta_longitude)
-                )
-            if delta_altitude != 0:
-                block_data.extend(
-                    self._write_varint_s32(delta_altitude)
-                )
-
-            self.points_since_last_full += 1
 
-        self.previous_point = point
-        return block_data
+        if full_indices:
+            self.points_since_last_full = count - 1 - full_indices[-1]
+        else:
+            self.points_since_last_full += count
+        if points:
+            self.previous_point = points[-1]
+        return pos
 
     def encode_points(self, points: list[GpsPoint]) -> bytes:
-        self.output_buffer.clear()
-        for point in points:
-            block_data = self.encode_point(point)
-            self.output_buffer.extend(block_data)
-        return bytes(self.output_buffer)
-
-
-def convert_to_gpx(
-    points_data: list[dict], filename: str = "track"
-) -> str:
-    """Convert decoded points to GPX format."""
-    if not points_data:
-        return ""
+        # Size for the worst case up front and trim once at the end
+        buf = bytearray(len(points) * MAX_BLOCK_SIZE)
+        end = self._encode_into(points, buf, 0)
+        del buf[end:]
+        self.output_buffer = buf
+        return bytes(buf)
 
-    points = [item["data"] for item in points_data]
 
-    gpx = f"""<?xml version="1.0" encoding="UTF-8" standalone="no" ?>
+def convert_to_gpx(track: GpsTrack, filename: str = "track") -> str:
+    """Convert a decoded track to GPX format."""
+    if not len(track):
+        return ""
+
+    timestamps_iso = _format_timestamps(track.timestamps)
+    header = f"""<?xml version="1.0" encoding="UTF-8" standalone="no" ?>
 <gpx xmlns="http://www.topografix.com/GPX/1/1"
     xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
     xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd"
     version="1.1" creator="gps-tracker-tools">
   <metadata>
     <name>{filename}</name>
-    <time>{datetime.fromtimestamp(points[0]['timestamp']).isoformat()}</time>
+    <time>{timestamps_iso[0]}</time>
   </metadata>
   <trk>
     <name>{filename}</name>
     <trkseg>
 """
-    for point in points:
-        lat = point["latitude"]
-        lon = point["longitude"]
-        ele = point["altitude"]
-        ts = datetime.fromtimestamp(point["timestamp"]).isoformat()
-
-        if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
-            print(f"Skipping invalid point: Lat {lat}, Lon {lon}")
-            continue
-
-        gpx += f'      <trkpt lat="{lat:.5f}" lon="{lon:.5f}">\n'
-        gpx += f"        <ele>{ele:.1f}</ele>\n"
-        gpx += f"        <time>{ts}</time>\n"
-        gpx += "      </trkpt>\n"
+    rows = zip(
+        timestamps_iso, track.latitudes, track.longitudes, track.altitudes
+    )
+    # Range-check the whole columns first; only a track that actually has
+    # out-of-range points pays for a per-point check
+    lats, lons = track.latitudes, track.longitudes
+    if not (
+        min(lats) >= -MAX_LATITUDE_SCALED
+        and max(lats) <= MAX_LATITUDE_SCALED
+        and min(lons) >= -MAX_LONGITUDE_SCALED
+        and max(lons) <= MAX_LONGITUDE_SCALED
+    ):
+        valid = [
+            -MAX_LATITUDE_SCALED <= lat <= MAX_LATITUDE_SCALED
+            and -MAX_LONGITUDE_SCALED <= lon <= MAX_LONGITUDE_SCALED
+            for lat, lon in zip(lats, lons)
+        ]
+        print(f"Skipping {valid.count(False)} invalid points")
+        rows = itertools.compress(rows, valid)
+
+    parts = [header]
+    for ts, lat_scaled, lon_scaled, alt_scaled in rows:
+        lat = lat_scaled / 1e5
+        lon = lon_scaled / 1e5
+        ele = alt_scaled / 10.0
+        parts.append(
+            f'      <trkpt lat="{lat:.5f}" lon="{lon:.5f}">\n'
+            f"        <ele>{ele:.1f}</ele>\n"
+            f"        <time>{ts}</time>\n"
+            "      </trkpt>\n"
+        )
 
-    gpx += """    </trkseg>
+    parts.append(
+        """    </trkseg>
   </trk>
 </gpx>"""
-    return gpx
+    )
+    return "".join(parts)
 
 
 # ---------------------------------------------------------------------------
@@ -375,27 +866,41 @@ def convert_to_gpx(
 # ---------------------------------------------------------------------------
 
 
-def cmd_decode(args):
-    with open(args.input, "rb") as f:
-        binary_data = f.read()
+@contextlib.contextmanager
+def _map_input(path: str):
+    """Map a binary input file read-only for the duration of the block."""
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b""
+            return
+        with mapped:
+            yield mapped
 
-    decoder = GpsFormatDecoder()
-    points = decoder.decode_file(binary_data)
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "file_info": {
-                    "input_file": args.input,
-                    "total_points": len(points),
-                    "format_version": "1.0",
-                },
-                "points": points,
-            },
-            f,
-            indent=2,
-            ensure_ascii=False,
+def cmd_decode(args):
+    with _map_input(args.input) as binary_data:
+        decoder = GpsFormatDecoder()
+        points = decoder.decode_file(
+            binary_data, include_scaled=args.include_scaled, workers=args.jobs
         )
+
+    output = {
+        "file_info": {
+            "input_file": args.input,
+            "total_points": len(points),
+            "format_version": "1.0",
+        },
+        "points": points,
+    }
+    if orjson is not None:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
     print(f"Decoded {len(points)} points to {args.output}")
 
 
@@ -422,48 +927,45 @@ def cmd_encode(args):
 
 
 def cmd_to_gpx(args):
-    with open(args.input, "rb") as f:
-        binary_data = f.read()
-
-    decoder = GpsFormatDecoder()
-    points = decoder.decode_file(binary_data)
-    gpx_content = convert_to_gpx(points, Path(args.input).stem)
+    with _map_input(args.input) as binary_data:
+        decoder = GpsFormatDecoder()
+        track = decoder.decode_track(binary_data, args.jobs)
+    gpx_content = convert_to_gpx(track, Path(args.input).stem)
 
     with open(args.output, "w", encoding="utf-8") as f:
         f.write(gpx_content)
     print(
-        f"Converted {len(points)} points to GPX: {args.output}"
+        f"Converted {len(track)} points to GPX: {args.output}"
     )
 
 
 def cmd_validate(args):
-    with open(args.input, "rb") as f:
-        binary_data = f.read()
-
-    decoder = GpsFormatDecoder()
-    points = decoder.decode_file(binary_data)
+    with _map_input(args.input) as binary_data:
+        decoder = GpsFormatDecoder()
+        track = decoder.decode_track(binary_data, args.jobs)
+        file_size = len(binary_data)
 
     print("File validation successful!")
-    print(f"  Total points: {len(points)}")
-    print(f"  File size: {len(binary_data)} bytes")
+    print(f"  Total points: {len(track)}")
+    print(f"  File size: {file_size} bytes")
 
-    full_blocks = sum(1 for p in points if p["type"] == "full")
-    delta_blocks = sum(1 for p in points if p["type"] == "delta")
+    full_blocks = track.block_types.count("full")
+    delta_blocks = track.block_types.count("delta")
 
     print(f"  Full blocks: {full_blocks}")
     print(f"  Delta blocks: {delta_blocks}")
 
-    if len(points) >= 2:
-        first_ts = points[0]["data"]["timestamp"]
-        last_ts = points[-1]["data"]["timestamp"]
+    if len(track) >= 2:
+        first_ts = track.timestamps[0]
+        last_ts = track.timestamps[-1]
         duration = last_ts - first_ts
         print(
             f"  Duration: {duration} seconds ({duration/3600:.1f} hours)"
         )
 
-    if points:
+    if len(track):
         print(
-            f"  Compression ratio: {len(binary_data) / (len(points) * 16):.2f}x"
+            f"  Compression ratio: {file_size / (len(track) * 16):.2f}x"
         )
 
 
@@ -485,6 +987,20 @@ def add_subcommands(subparsers) -> None:
         default=64,
         help="Full block interval (default: 64)",
     )
+    decode_p.add_argument(
+        "--include-scaled",
+        action="store_true",
+        help="Also write the raw scaled integer fields",
+    )
+    decode_p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Decode files of 1 MiB or more with N worker processes "
+        "(default: 1)",
+    )
     decode_p.set_defaults(func=cmd_decode)
 
     encode_p = subparsers.add_parser(
@@ -505,12 +1021,30 @@ def add_subcommands(subparsers) -> None:
     )
     gpx_p.add_argument("input", help="Input binary file")
     gpx_p.add_argument("output", help="Output GPX file")
+    gpx_p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Decode files of 1 MiB or more with N worker processes "
+        "(default: 1)",
+    )
     gpx_p.set_defaults(func=cmd_to_gpx)
 
     validate_p = subparsers.add_parser(
         "validate", help="Validate binary file format"
     )
     validate_p.add_argument("input", help="Input binary file")
+    validate_p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Decode files of 1 MiB or more with N worker processes "
+        "(default: 1)",
+    )
     validate_p.set_defaults(func=cmd_validate)
 
 
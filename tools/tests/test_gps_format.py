@@ -0,0 +1,52 @@
+import contextlib
+import io
+import struct
+import unittest
+
+from gps_tracker_tools.gps_format import GpsFormatDecoder
+
+
+def _full_block(timestamp, lat, lon, alt):
+    return struct.pack("<BIiii", 0xFF, timestamp, lat, lon, alt)
+
+
+def _decode(data):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        track = GpsFormatDecoder().decode_track(data, workers=1)
+    return track, out.getvalue()
+
+
+class DeltaOverflowTest(unittest.TestCase):
+    def assert_consistent(self, track, length):
+        self.assertEqual(len(track.timestamps), length)
+        self.assertEqual(len(track.latitudes), length)
+        self.assertEqual(len(track.longitudes), length)
+        self.assertEqual(len(track.altitudes), length)
+        self.assertEqual(len(track.block_types), length)
+
+    def test_overflow_in_last_run_is_a_decode_error(self):
+        # Latitude delta of -2**34 leaves the int32 column range
+        data = _full_block(1700000000, 3100000, 0, 0) + bytes(
+            [0x04, 0xFF, 0xFF, 0xFF, 0xFF, 0x7F]
+        )
+        track, output = _decode(data)
+        self.assertIn("Error decoding block 1 at offset 17", output)
+        self.assert_consistent(track, 1)
+        self.assertEqual(track.block_types, ["full"])
+
+    def test_overflow_keeps_blocks_before_it(self):
+        data = (
+            _full_block(1700000000, 3100000, 0, 0)
+            + bytes([0x08, 0x02, 0x04, 0x04])
+            + bytes([0x04, 0xFF, 0xFF, 0xFF, 0xFF, 0x7F])
+            + _full_block(1700000010, 3100000, 0, 0)
+        )
+        track, output = _decode(data)
+        self.assertIn("Error decoding block 3 at offset 21", output)
+        self.assert_consistent(track, 3)
+        self.assertEqual(list(track.latitudes), [3100000, 3100000, 3100002])
+
+
+if __name__ == "__main__":
+    unittest.main()